@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Benchmark the redaction of log lines
+
+Generates synthetic log lines shaped like the rows of `main.sql` and
+reports lines/sec, ns/line and peak traced memory for every
+implementation.
+
+    ./bench_redaction.py --save baseline.json
+    ./bench_redaction.py --compare baseline.json --tolerance 0.1
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from filtered_logger import RedactingFormatter, filter_datum
+
+
+COLUMNS = ("name", "email", "phone", "ssn", "password", "ip",
+           "last_login", "user_agent")
+SAMPLE_VALUES = {
+    "name": "Marlene Wood",
+    "email": "hwestiii@att.net",
+    "phone": "(473) 401-4253",
+    "ssn": "261-72-6780",
+    "password": "K5?BMNv",
+    "ip": "60ed:c396:2ff:244:bbd0:9208:26f2:93ea",
+    "last_login": "2019-11-14 06:14:24",
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/74.0.3729.157",
+}
+REDACTION = "***"
+
+
+def legacy_filter_datum(
+    fields: List[str], redaction: str, message: str, separator: str
+) -> str:
+    """The original one `re.sub` per field implementation"""
+    for field in fields:
+        pattern = r"{}=([^{}]+)".format(field, separator)
+        message = re.sub(pattern, "{}={}".format(field, redaction), message)
+    return message
+
+
+def _legacy(fields: Tuple[str, ...], separator: str) -> Callable:
+    """Redact with the original implementation"""
+    return lambda line: legacy_filter_datum(
+        fields, REDACTION, line, separator
+    )
+
+
+def _filter_datum(fields: Tuple[str, ...], separator: str) -> Callable:
+    """Redact with `filter_datum`"""
+    return lambda line: filter_datum(fields, REDACTION, line, separator)
+
+
+def _formatter(fields: Tuple[str, ...], separator: str) -> Callable:
+    """Format and redact a log record with `RedactingFormatter`"""
+    formatter_class = type(
+        "BenchFormatter", (RedactingFormatter,), {"SEPARATOR": separator}
+    )
+    formatter = formatter_class(fields=fields)
+
+    def run(line: str) -> str:
+        record = logging.LogRecord(
+            "user_data", logging.INFO, None, None, line, None, None
+        )
+        return formatter.format(record)
+    return run
+
+
+IMPLEMENTATIONS: Dict[str, Callable] = {
+    "legacy": _legacy,
+    "filter_datum": _filter_datum,
+    "formatter": _formatter,
+}
+CASES = [
+    # (field count, PII proportion, separator, value length multiplier)
+    (8, 0.625, ";", 1),
+    (8, 0.625, "|", 1),
+    (8, 0.25, ";", 1),
+    (8, 1.0, ";", 1),
+    (16, 0.5, ";", 1),
+    (32, 0.5, ";", 1),
+    (8, 0.625, ";", 8),
+]
+
+
+def make_case(
+    field_count: int, pii_ratio: float, separator: str, length: int,
+    lines: int, seed: int = 0
+) -> Tuple[Tuple[str, ...], List[str]]:
+    """Return the PII fields and the synthetic log lines of a case"""
+    rng = random.Random(seed)
+    columns = [
+        "{}{}".format(COLUMNS[i % len(COLUMNS)], i // len(COLUMNS) or "")
+        for i in range(field_count)
+    ]
+    fields = tuple(columns[:round(field_count * pii_ratio)])
+    messages = []
+    for _ in range(lines):
+        parts = []
+        for column in columns:
+            value = SAMPLE_VALUES[column.rstrip("0123456789")]
+            value = value.replace(separator, " ") * length
+            parts.append("{}={}{}".format(
+                column, value[:rng.randint(1, len(value))], separator
+            ))
+        messages.append("".join(parts))
+    return fields, messages
+
+
+def measure(run: Callable, messages: List[str], repeat: int) -> dict:
+    """Time `run` over `messages` and trace its peak memory use"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for message in messages:
+            run(message)
+        best = min(best, time.perf_counter_ns() - start)
+
+    tracemalloc.start()
+    for message in messages:
+        run(message)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ns_per_line = best / len(messages)
+    return {
+        "lines_per_sec": round(1e9 / ns_per_line, 1),
+        "ns_per_line": round(ns_per_line, 1),
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(
+    names: List[str], lines: int, repeat: int
+) -> Dict[str, dict]:
+    """Run every case against every implementation in `names`"""
+    results = {}
+    for field_count, pii_ratio, separator, length in CASES:
+        fields, messages = make_case(
+            field_count, pii_ratio, separator, length, lines
+        )
+        for name in names:
+            key = "{} fields={} pii={} sep={} len=x{}".format(
+                name, field_count, pii_ratio, separator, length
+            )
+            run = IMPLEMENTATIONS[name](fields, separator)
+            results[key] = measure(run, messages, repeat)
+            print("{:<48} {:>12,.0f} lines/s {:>9,.0f} ns/line".format(
+                key, results[key]["lines_per_sec"],
+                results[key]["ns_per_line"]
+            ))
+    return results
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float
+) -> List[str]:
+    """Return the cases that got slower than `baseline` by `tolerance`"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]["ns_per_line"]
+        change = (result["ns_per_line"] - old) / old
+        if change > tolerance:
+            regressions.append("{}: {:.1f} -> {:.1f} ns/line (+{:.0%})".format(
+                key, old, result["ns_per_line"], change
+            ))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--impl", action="append",
+                        choices=sorted(IMPLEMENTATIONS),
+                        help="implementation to run (default: all)")
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="JSON baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed ns/line increase (default: 0.1)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.impl or list(IMPLEMENTATIONS), args.lines, args.repeat
+    )
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION {}".format(regression))
+        sys.exit(1 if regressions else 0)
@@ -1,14 +1,108 @@
 #!/usr/bin/env python3
 """This module encrypts passwords"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple
+import os
+import sys
+import time
 import bcrypt
 
 
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
 def hash_password(password: str) -> bytes:
     """Return a salted, hashed password"""
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode("utf-8"), salt)
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
-    """Validate that provided password matches the hashed password"""
-    return bcrypt.checkpw(password.encode("utf-8"), hashed_password)
+def needs_rehash(hashed_password: bytes) -> bool:
+    """Check if a hash was made with another scheme or work factor"""
+    try:
+        _, prefix, rounds, _ = hashed_password.split(b"$", 3)
+        return prefix != b"2b" or int(rounds) != BCRYPT_ROUNDS
+    except ValueError:
+        return True
+
+
+def is_valid(
+    hashed_password: bytes, password: str,
+    rehash: Callable[[bytes], None] = None
+) -> bool:
+    """Validate that provided password matches the hashed password
+
+    On success, if the hash is outdated, `rehash` is called with a new
+    hash of the password made with the current work factor.
+    """
+    valid = bcrypt.checkpw(password.encode("utf-8"), hashed_password)
+    if valid and rehash is not None and needs_rehash(hashed_password):
+        rehash(hash_password(password))
+    return valid
+
+
+def calibrate_rounds(
+    target_ms: float = 250, min_rounds: int = 4, max_rounds: int = 31
+) -> int:
+    """Return the highest work factor whose hash time on this machine
+    stays within `target_ms`
+    """
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds))
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            return max(min_rounds, rounds - 1)
+    return max_rounds
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """Validate a (hashed_password, password) pair"""
+    return is_valid(*pair)
+
+
+def _ordered_map(
+    func: Callable, items: Iterable, workers: int = None,
+    processes: bool = False
+) -> Iterator:
+    """Yield `func(item)` for every item, in order, from a worker pool
+
+    At most twice `workers` items are in flight, so results stream out
+    of arbitrarily long iterables without queueing all of them at once.
+    """
+    workers = workers or os.cpu_count() or 1
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def hash_passwords(
+    passwords: Iterable[str], workers: int = None, processes: bool = False
+) -> Iterator[bytes]:
+    """Hash many passwords in parallel, yielding hashes in input order
+
+    bcrypt releases the GIL, so threads scale across cores; set
+    `processes` to use a process pool instead.
+    """
+    return _ordered_map(hash_password, passwords, workers, processes)
+
+
+def verify_many(
+    pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+    processes: bool = False
+) -> Iterator[bool]:
+    """Validate many (hashed_password, password) pairs in parallel,
+    yielding results in input order
+    """
+    return _ordered_map(_is_valid_pair, pairs, workers, processes)
+
+
+if __name__ == "__main__":
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    print(calibrate_rounds(target))
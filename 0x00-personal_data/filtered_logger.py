@@ -1,53 +1,313 @@
 #!/usr/bin/env python3
 """Regex-ing"""
 import re
-from typing import List
+import argparse
+import atexit
+import copy
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from typing import IO, Iterator, List, Mapping, Optional, Tuple
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from mysql.connector.connection import MySQLConnection
 from os import getenv
 import mysql.connector
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+EXPORT_FORMATS = ("text", "jsonl")
+
+_pool = None
+_pool_pid = None
+
+
+class RedactionEngine:
+    """Redacts every field of a log message in a single regex pass"""
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """Compile one pattern for all the fields
+
+        The pattern starts with the literal `=`, so the regex engine jumps
+        from one `=` to the next and only then checks, with one lookbehind
+        per field, which field name precedes it.
+        """
+        self.fields = fields
+        self.field_set = frozenset(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.pattern = re.compile(self.source(separator)) if fields \
+            else None
+        self.replacement = "={}".format(redaction.replace("\\", r"\\"))
+        self._bytes_pattern = None
+
+    def source(self, stop: str) -> str:
+        """Return the pattern source matching a field and its value, which
+        ends before any of the `stop` characters
+        """
+        return r"=(?:{})[^{}]+".format(
+            "|".join(
+                "(?<={}=)".format(re.escape(field)) for field in self.fields
+            ),
+            re.escape(stop),
+        )
+
+    def redact(self, message: str) -> str:
+        """Returns the message with all the fields obfuscated"""
+        if self.pattern is None:
+            return message
+        return self.pattern.sub(self.replacement, message)
+
+    def redact_bytes(self, data: bytes) -> bytes:
+        """Returns UTF-8 encoded data with all the fields obfuscated,
+        without decoding it
+
+        The data may hold several lines: a value also ends at a line end,
+        as it would if every line were redacted on its own.
+        """
+        if self.pattern is None:
+            return data
+        if self._bytes_pattern is None:
+            if not self.separator.isascii():
+                raise ValueError("bytes redaction needs an ASCII separator")
+            self._bytes_pattern = re.compile(
+                self.source(self.separator + "\r\n").encode()
+            )
+        return self._bytes_pattern.sub(self.replacement.encode(), data)
+
+    def redact_mapping(self, mapping: Mapping) -> dict:
+        """Returns a copy of the mapping with the fields' values replaced"""
+        return {
+            key: self.redaction if key in self.field_set else value
+            for key, value in mapping.items()
+        }
+
+    def render(self, mapping: Mapping) -> str:
+        """Returns the mapping as `key=value` pairs, fields obfuscated"""
+        return "".join(
+            "{}={}{}".format(key, value, self.separator)
+            for key, value in self.redact_mapping(mapping).items()
+        )
+
+
+@lru_cache(maxsize=None)
+def redaction_engine(
+    fields: Tuple[str, ...], redaction: str, separator: str
+) -> RedactionEngine:
+    """Return the cached engine for a (fields, separator, redaction) tuple"""
+    return RedactionEngine(fields, redaction, separator)
 
 
 def filter_datum(
     fields: List[str], redaction: str, message: str, separator: str
 ) -> str:
     """Returns the log message obfuscated"""
-    for field in fields:
-        pattern = r"{}=([^{}]+)".format(field, separator)
-        message = re.sub(pattern, "{}={}".format(field, redaction), message)
-    return message
+    engine = redaction_engine(tuple(fields), redaction, separator)
+    return engine.redact(message)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Queue handler that either blocks or drops records when full"""
+
+    def __init__(self, log_queue: queue.Queue, block: bool = True):
+        """Initialize the handler with its overflow policy"""
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
 
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Enqueue a record, honouring the drop/block policy"""
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-def get_logger() -> logging.Logger:
-    """Return a `logging.Logger` object"""
+
+class FlushingQueueListener(QueueListener):
+    """Queue listener that drains every pending record on stop"""
+
+    def enqueue_sentinel(self) -> None:
+        """Wait for room in a full queue instead of raising"""
+        self.queue.put(self._sentinel)
+
+
+def _stop_listener(logger: logging.Logger) -> None:
+    """Stop the background listener of `logger` if there is one"""
+    listener = getattr(logger, "listener", None)
+    if listener is not None:
+        logger.listener = None
+        listener.stop()
+
+
+def get_logger(
+    asynchronous: bool = False, queue_size: int = 10000, block: bool = True
+) -> logging.Logger:
+    """Return a `logging.Logger` object
+
+    With `asynchronous` set, records are put on a bounded queue and a
+    background listener does the redaction and the stream I/O. When the
+    queue is full, callers wait if `block` is set, else the record is
+    dropped. Calling it again with the same mode reuses the handler.
+    """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    for handler in logger.handlers:
+        if isinstance(handler, BoundedQueueHandler) == asynchronous:
+            return logger
+    _stop_listener(logger)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
     handler = logging.StreamHandler()
     handler.setFormatter(RedactingFormatter(fields=PII_FIELDS))
-    logger.addHandler(handler)
-    logger.propagate = False
+    if not asynchronous:
+        logger.addHandler(handler)
+        return logger
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    logger.addHandler(BoundedQueueHandler(log_queue, block=block))
+    logger.listener = FlushingQueueListener(log_queue, handler)
+    logger.listener.start()
+    atexit.register(_stop_listener, logger)
 
     return logger
 
 
+def _db_config() -> dict:
+    """Return the connection settings from the environment"""
+    return {
+        "host": getenv("PERSONAL_DATA_DB_HOST", "localhost"),
+        "user": getenv("PERSONAL_DATA_DB_USERNAME", "root"),
+        "password": getenv("PERSONAL_DATA_DB_PASSWORD", ""),
+        "database": getenv("PERSONAL_DATA_DB_NAME", "my_db"),
+    }
+
+
+class PooledConnection:
+    """Connection borrowed from a `ConnectionPool`
+
+    Attributes are those of the wrapped connection, except `close()`
+    which gives it back to the pool.
+    """
+
+    def __init__(self, pool: "ConnectionPool", cnx: MySQLConnection):
+        """Wrap a connection of `pool`"""
+        self._pool = pool
+        self._cnx = cnx
+
+    def __getattr__(self, name: str):
+        """Delegate to the wrapped connection"""
+        if self._cnx is None:
+            raise mysql.connector.errors.OperationalError(
+                "connection already returned to the pool"
+            )
+        return getattr(self._cnx, name)
+
+    def close(self) -> None:
+        """Give the connection back to the pool"""
+        if self._cnx is not None:
+            cnx, self._cnx = self._cnx, None
+            self._pool.put_connection(cnx)
+
+
+class ConnectionPool:
+    """Pool of database connections, opened on first need
+
+    Up to `size` idle connections are kept; a borrowed one is pinged
+    and reconnected if it went stale. When none is idle, a new
+    connection is opened, so borrowers never wait; connections given
+    back to a full pool are closed.
+    """
+
+    def __init__(self, name: str, size: int, **config):
+        """Initialize an empty pool"""
+        self.name = name
+        self.size = size
+        self.config = config
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get_connection(self) -> PooledConnection:
+        """Borrow an idle connection, or a new one if none is idle"""
+        try:
+            cnx = self._idle.get_nowait()
+        except queue.Empty:
+            cnx = mysql.connector.connect(**self.config)
+            with self._lock:
+                self.created += 1
+        else:
+            cnx.ping(reconnect=True)
+            with self._lock:
+                self.reused += 1
+        return PooledConnection(self, cnx)
+
+    def put_connection(self, cnx: MySQLConnection) -> None:
+        """Take a connection back, closing it if it can't be reused"""
+        try:
+            cnx.reset_session()
+            self._idle.put_nowait(cnx)
+        except (mysql.connector.Error, queue.Full):
+            cnx.close()
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    """Return the connection pool of the current process
+
+    The pool is named and sized from `PERSONAL_DATA_DB_POOL_NAME` and
+    `PERSONAL_DATA_DB_POOL_SIZE`; a size of 0 disables pooling. A forked
+    child gets its own pool instead of sharing the parent's sockets.
+    """
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        _pool_pid = os.getpid()
+        size = int(getenv("PERSONAL_DATA_DB_POOL_SIZE", "5"))
+        if size <= 0:
+            _pool = None
+        else:
+            _pool = ConnectionPool(
+                getenv("PERSONAL_DATA_DB_POOL_NAME", "personal_data"),
+                size,
+                **_db_config(),
+            )
+    return _pool
+
+
 def get_db() -> MySQLConnection:
-    """Returns a connector to the database"""
-    username = getenv("PERSONAL_DATA_DB_USERNAME", "root")
-    password = getenv("PERSONAL_DATA_DB_PASSWORD", "")
-    host = getenv("PERSONAL_DATA_DB_HOST", "localhost")
-    db_name = getenv("PERSONAL_DATA_DB_NAME", "my_db")
+    """Returns a connector to the database
 
-    connection = mysql.connector.connect(
-        host=host,
-        user=username,
-        password=password,
-        database=db_name,
-    )
+    The connection is borrowed from the pool; `close()` gives it back.
+    """
+    pool = get_pool()
+    if pool is None:
+        return mysql.connector.connect(**_db_config())
+    return pool.get_connection()
 
-    return connection
+
+@contextmanager
+def db_connection(pooled: bool = True) -> Iterator[MySQLConnection]:
+    """Borrow a database connection for the duration of a `with` block,
+    or open one of its own, closed at the end, if `pooled` is false
+    """
+    db = get_db() if pooled else mysql.connector.connect(**_db_config())
+    try:
+        yield db
+    finally:
+        db.close()
 
 
 def main() -> None:
@@ -57,15 +317,163 @@ def main() -> None:
     cursor.execute("SELECT * FROM users;")
     logger = get_logger()
     for row in cursor:
-        message = (
-            "name={};email={};phone={};ssn={};password={};ip={};"
-            "last_login={};user_agent={};".format(*row)
-        )
-        logger.info(message)
+        logger.info("", extra={"fields": dict(zip(cursor.column_names, row))})
     cursor.close()
     db.close()
 
 
+def open_output(output: str) -> IO[str]:
+    """Return a context manager over the export target (`-` is stdout)"""
+    if output == "-":
+        return nullcontext(sys.stdout)
+    return open(output, "w", encoding="utf-8")
+
+
+def write_batches(
+    cursor, out: IO[str], batch_size: int = 1000,
+    output_format: str = "text"
+) -> int:
+    """Write the rows of an executed cursor to `out` in redacted batches
+
+    Each batch of `batch_size` rows is fetched, redacted in one go and
+    written with a single call. Returns the number of rows written.
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError("unknown export format: {}".format(output_format))
+    formatter = RedactingFormatter(fields=PII_FIELDS)
+    columns = cursor.column_names
+    row_format = "".join(
+        "{}={{}}{}".format(column, formatter.SEPARATOR) for column in columns
+    ) + "\n"
+    count = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        if output_format == "jsonl":
+            chunk = "".join(
+                json.dumps(
+                    formatter.engine.redact_mapping(dict(zip(columns, row))),
+                    default=str,
+                ) + "\n"
+                for row in rows
+            )
+        else:
+            chunk = formatter.engine.redact(
+                "".join(row_format.format(*row) for row in rows)
+            )
+        out.write(chunk)
+        count += len(rows)
+    return count
+
+
+def export_users(
+    output: str = "-", batch_size: int = 1000, output_format: str = "text"
+) -> int:
+    """Stream the users table to `output` in constant memory
+
+    Rows are read from an unbuffered cursor, so the server streams them
+    as they are fetched instead of the client buffering the whole table.
+    """
+    with db_connection() as db:
+        cursor = db.cursor(buffered=False)
+        try:
+            cursor.execute("SELECT * FROM users;")
+            with open_output(output) as out:
+                return write_batches(cursor, out, batch_size, output_format)
+        finally:
+            cursor.close()
+
+
+def partition_ranges(
+    db: MySQLConnection, column: str, partitions: int
+) -> List[Tuple[str, tuple]]:
+    """Split the users table into ranges of a numeric or temporal column
+
+    Returns `(where clause, params)` pairs in column order, rows where
+    the column is NULL first.
+    """
+    if not re.fullmatch(r"\w+", column):
+        raise ValueError("invalid column name: {}".format(column))
+    cursor = db.cursor()
+    cursor.execute("SELECT MIN({0}), MAX({0}) FROM users;".format(column))
+    low, high = cursor.fetchone()
+    cursor.close()
+
+    ranges = [("{} IS NULL".format(column), ())]
+    if low is None:
+        return ranges
+    bounds = [low + (high - low) * i // partitions for i in range(partitions)]
+    bounds.append(high)
+    for i in range(partitions):
+        upper = "<=" if i == partitions - 1 else "<"
+        ranges.append((
+            "{0} >= %s AND {0} {1} %s".format(column, upper),
+            (bounds[i], bounds[i + 1]),
+        ))
+    return ranges
+
+
+def _export_partition(
+    column: str, where: str, params: tuple, path: str, batch_size: int,
+    output_format: str
+) -> int:
+    """Export one range of the users table to its own file
+
+    Every worker process uses a single direct connection rather than a
+    pool of its own.
+    """
+    with db_connection(pooled=False) as db:
+        cursor = db.cursor(buffered=False)
+        try:
+            cursor.execute(
+                "SELECT * FROM users WHERE {} ORDER BY {};".format(
+                    where, column
+                ),
+                params,
+            )
+            with open(path, "w", encoding="utf-8") as out:
+                return write_batches(cursor, out, batch_size, output_format)
+        finally:
+            cursor.close()
+
+
+def parallel_export_users(
+    output: str = "-", workers: int = None, partitions: int = None,
+    column: str = "last_login", batch_size: int = 1000,
+    output_format: str = "text"
+) -> int:
+    """Export the users table with one process and connection per range
+
+    The table is split into `partitions` ranges of `column` (one per
+    worker by default); every range is written to its own file, then the
+    files are concatenated in order into `output`.
+    """
+    workers = workers or os.cpu_count() or 1
+    with db_connection() as db:
+        ranges = partition_ranges(db, column, partitions or workers)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [
+            os.path.join(tmp_dir, "part{}".format(i))
+            for i in range(len(ranges))
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _export_partition, column, where, params, path,
+                    batch_size, output_format
+                )
+                for (where, params), path in zip(ranges, paths)
+            ]
+            count = sum(future.result() for future in futures)
+        with open_output(output) as out:
+            for path in paths:
+                with open(path, encoding="utf-8") as part:
+                    shutil.copyfileobj(part, out)
+    return count
+
+
 class RedactingFormatter(logging.Formatter):
     """Redacting Formatter class"""
 
@@ -77,14 +485,56 @@ class RedactingFormatter(logging.Formatter):
         """Initalize formatter"""
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.engine = redaction_engine(
+            tuple(fields), self.REDACTION, self.SEPARATOR
+        )
 
     def format(self, record: logging.LogRecord) -> str:
-        """Fitered formatter"""
+        """Fitered formatter
+
+        Records carrying a `fields` mapping (passed through `extra`) have
+        their PII keys replaced before the single render, so only their
+        message is scanned instead of the whole formatted string. Any
+        other record is rendered, then scanned.
+        """
+        if isinstance(getattr(record, "fields", None), Mapping):
+            return super().format(self.redact_record(record))
         unsafe_str = super().format(record)
-        return filter_datum(
-            self.fields, self.REDACTION, unsafe_str, self.SEPARATOR
-        )
+        return self.engine.redact(unsafe_str)
+
+    def redact_record(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return a copy of a record with its `fields` mapping rendered
+        after its message, PII values replaced
+        """
+        record = copy.copy(record)
+        message = self.engine.redact(record.getMessage())
+        rendered = self.engine.render(record.fields)
+        record.msg = "{} {}".format(message, rendered) if message \
+            else rendered
+        record.args = None
+        return record
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--stream", action="store_true",
+                        help="export the table in redacted batches")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--output", default="-",
+                        help="output file, `-` for stdout")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="text")
+    parser.add_argument("--workers", type=int,
+                        help="export ranges of the table in parallel")
+    parser.add_argument("--partitions", type=int,
+                        help="number of ranges (default: --workers)")
+    parser.add_argument("--partition-column", default="last_login")
+    args = parser.parse_args()
+    if args.workers:
+        parallel_export_users(
+            args.output, args.workers, args.partitions,
+            args.partition_column, args.batch_size, args.format
+        )
+    elif args.stream:
+        export_users(args.output, args.batch_size, args.format)
+    else:
+        main()
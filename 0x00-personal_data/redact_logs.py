@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Redact PII from existing log files
+
+Uses the field/separator semantics of `filter_datum`. The input file is
+memory-mapped and split into chunks at line boundaries; worker processes
+redact the chunks as bytes and every chunk is written back in order with
+a single write, so files larger than RAM go through in bounded memory.
+
+    ./redact_logs.py old.log -o clean.log --workers 8
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+from filtered_logger import PII_FIELDS, RedactingFormatter, redaction_engine
+
+
+def chunk_bounds(path: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Yield `(start, end)` offsets of chunks of about `chunk_size` bytes
+    that end on a line boundary
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            yield start, end
+            start = end
+
+
+def redact_chunk(
+    path: str, start: int, end: int, fields: Tuple[str, ...],
+    redaction: str, separator: str
+) -> bytes:
+    """Return the redacted bytes of one chunk of the file"""
+    engine = redaction_engine(fields, redaction, separator)
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return engine.redact_bytes(mm[start:end])
+
+
+def redact_file(
+    path: str, output: str, fields: Tuple[str, ...] = PII_FIELDS,
+    redaction: str = RedactingFormatter.REDACTION,
+    separator: str = RedactingFormatter.SEPARATOR,
+    workers: int = None, chunk_size: int = 64 * 1024 * 1024
+) -> int:
+    """Redact `path` into `output` and return the number of bytes read
+
+    At most twice `workers` chunks are in flight at a time.
+    """
+    workers = workers or os.cpu_count() or 1
+    processed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(output, "wb") as out:
+        pending = deque()
+        for start, end in chunk_bounds(path, chunk_size):
+            pending.append(executor.submit(
+                redact_chunk, path, start, end, fields, redaction, separator
+            ))
+            processed += end - start
+            if len(pending) >= 2 * workers:
+                out.write(pending.popleft().result())
+        while pending:
+            out.write(pending.popleft().result())
+    return processed
+
+
+def main(argv: List[str] = None) -> None:
+    """Redact a log file and report the throughput"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--fields", default=",".join(PII_FIELDS),
+                        help="comma separated fields to redact")
+    parser.add_argument("--separator", default=RedactingFormatter.SEPARATOR)
+    parser.add_argument("--redaction", default=RedactingFormatter.REDACTION)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="chunk size in MB (default: 64)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    processed = redact_file(
+        args.input, args.output, tuple(args.fields.split(",")),
+        args.redaction, args.separator, args.workers,
+        args.chunk_size * 1024 * 1024
+    )
+    elapsed = time.perf_counter() - start
+    megabytes = processed / (1024 * 1024)
+    print("{:.1f} MB in {:.2f}s ({:.1f} MB/s)".format(
+        megabytes, elapsed, megabytes / elapsed if elapsed else 0
+    ), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Tests of filtered_logger
+
+    python3 -m unittest test_filtered_logger
+"""
+import logging
+import unittest
+from unittest import mock
+import filtered_logger
+
+
+class FakeConnection:
+    """Stand-in for a MySQL connection that records its calls"""
+
+    def __init__(self, **config):
+        """Record the connection settings"""
+        self.config = config
+        self.pings = 0
+        self.resets = 0
+        self.closed = False
+
+    def ping(self, reconnect: bool = False) -> None:
+        """Count the health checks"""
+        self.pings += 1
+
+    def reset_session(self) -> None:
+        """Count the session resets"""
+        self.resets += 1
+
+    def close(self) -> None:
+        """Mark the connection closed"""
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Connections of `get_db` against a fake connector"""
+
+    def setUp(self):
+        """Give every test a fresh pool of 2 and a fake connector"""
+        connect = mock.patch.object(
+            filtered_logger.mysql.connector, "connect",
+            side_effect=FakeConnection
+        )
+        self.connect = connect.start()
+        self.addCleanup(connect.stop)
+        env = mock.patch.dict(
+            "os.environ", {"PERSONAL_DATA_DB_POOL_SIZE": "2"}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+        filtered_logger._pool_pid = None
+        self.addCleanup(setattr, filtered_logger, "_pool_pid", None)
+
+    def test_reuse(self):
+        """Sequential borrowers share one connection"""
+        for _ in range(10):
+            with filtered_logger.db_connection():
+                pass
+        pool = filtered_logger.get_pool()
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertEqual((pool.created, pool.reused), (1, 9))
+        cnx = pool.get_connection()._cnx
+        self.assertEqual((cnx.pings, cnx.resets), (10, 10))
+
+    def test_lazy(self):
+        """No connection is opened before the first borrow"""
+        filtered_logger.get_pool()
+        self.assertEqual(self.connect.call_count, 0)
+
+    def test_overflow(self):
+        """Borrowers beyond the pool size get a connection of their own,
+        closed when given back
+        """
+        borrowed = [filtered_logger.get_db() for _ in range(3)]
+        connections = [db._cnx for db in borrowed]
+        for db in borrowed:
+            db.close()
+        self.assertEqual(self.connect.call_count, 3)
+        self.assertEqual(
+            [cnx.closed for cnx in connections], [False, False, True]
+        )
+        with filtered_logger.db_connection() as db:
+            self.assertIn(db._cnx, connections[:2])
+        self.assertEqual(self.connect.call_count, 3)
+
+    def test_close_twice(self):
+        """A connection closed twice is given back once"""
+        db = filtered_logger.get_db()
+        db.close()
+        db.close()
+        self.assertEqual(filtered_logger.get_pool()._idle.qsize(), 1)
+
+    def test_disabled(self):
+        """A pool size of 0 opens a connection per call"""
+        with mock.patch.dict(
+            "os.environ", {"PERSONAL_DATA_DB_POOL_SIZE": "0"}
+        ):
+            filtered_logger._pool_pid = None
+            filtered_logger.get_db().close()
+            filtered_logger.get_db().close()
+        self.assertIsNone(filtered_logger._pool)
+        self.assertEqual(self.connect.call_count, 2)
+
+
+class TestRedactionEngine(unittest.TestCase):
+    """Redaction of strings and bytes"""
+
+    def setUp(self):
+        """Use the engine of the formatter"""
+        self.engine = filtered_logger.redaction_engine(
+            filtered_logger.PII_FIELDS, "***", ";"
+        )
+
+    def test_redact(self):
+        """Every field is redacted, the other keys are kept"""
+        self.assertEqual(
+            self.engine.redact("name=Bob;ip=1.2.3.4;password=a=b;"),
+            "name=***;ip=1.2.3.4;password=***;"
+        )
+
+    def test_redact_bytes_line_end(self):
+        """A value at the end of a line without separator stops there"""
+        data = b"user login password=hunter2\nname=Bob;ip=1.2.3.4;\r\n" \
+            b"email=bob@x.io\r\nip=5.6.7.8;"
+        self.assertEqual(
+            self.engine.redact_bytes(data),
+            b"user login password=***\nname=***;ip=1.2.3.4;\r\n"
+            b"email=***\r\nip=5.6.7.8;"
+        )
+
+
+class TestRedactingFormatter(unittest.TestCase):
+    """Redaction of the records of every shape"""
+
+    def format(self, msg: str, args=None, **extra) -> str:
+        """Format a record and return its message part"""
+        record = logging.LogRecord(
+            "user_data", logging.INFO, None, None, msg, args, None
+        )
+        record.__dict__.update(extra)
+        formatter = filtered_logger.RedactingFormatter(
+            fields=filtered_logger.PII_FIELDS
+        )
+        return formatter.format(record).split(": ", 1)[1]
+
+    def test_args(self):
+        """Values formatted into the message are redacted"""
+        self.assertEqual(
+            self.format("name=%s;ip=%s;", ("Bob", "1.2.3.4")),
+            "name=***;ip=1.2.3.4;"
+        )
+
+    def test_mapping_args(self):
+        """Values of mapping args are redacted whatever their key"""
+        self.assertEqual(
+            self.format("email=%(e)s;", ({"e": "bob@x.io"},)),
+            "email=***;"
+        )
+
+    def test_fields(self):
+        """A `fields` mapping is rendered after the redacted message"""
+        fields = {"name": "Bob", "ip": "1.2.3.4"}
+        self.assertEqual(
+            self.format("", fields=fields), "name=***;ip=1.2.3.4;"
+        )
+        self.assertEqual(
+            self.format("email=%s;", ("bob",), fields=fields),
+            "email=***; name=***;ip=1.2.3.4;"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
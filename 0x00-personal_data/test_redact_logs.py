@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Tests of redact_logs
+
+    python3 -m unittest test_redact_logs
+"""
+import os
+import tempfile
+import unittest
+from filtered_logger import PII_FIELDS, filter_datum
+from redact_logs import redact_file
+
+
+class TestRedactFile(unittest.TestCase):
+    """Redaction of whole log files"""
+
+    def redact(self, text: str, **kwargs) -> str:
+        """Redact `text` through files and return the result"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "in.log")
+            output = os.path.join(tmp_dir, "out.log")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            redact_file(path, output, **kwargs)
+            with open(output, encoding="utf-8") as f:
+                return f.read()
+
+    def test_same_as_filter_datum(self):
+        """Every line comes out as `filter_datum` redacts it, even with
+        a value at the end of a line and lines split across chunks
+        """
+        lines = [
+            "user login password=hunter2",
+            "name=Bob;ip=1.2.3.4;",
+            "",
+            "email=bob@x.io",
+            "phone=555;ssn=123-45;user_agent=curl;",
+        ] * 50
+        expected = "".join(
+            filter_datum(PII_FIELDS, "***", line, ";") + "\n"
+            for line in lines
+        )
+        self.assertEqual(
+            self.redact("\n".join(lines) + "\n", workers=2, chunk_size=64),
+            expected
+        )
+
+    def test_empty(self):
+        """An empty file gives an empty file"""
+        self.assertEqual(self.redact(""), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,7 +11,7 @@ from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import CORS, cross_origin
 import os
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, ExcludedPaths
 
 
 app = Flask(__name__)
@@ -29,6 +29,15 @@ elif auth_type == 'session_db_auth':
     auth = SessionDBAuth()
 else:
     auth = Auth()
+excluded_paths = ExcludedPaths([
+    path.strip()
+    for path in getenv(
+        "AUTH_EXCLUDED_PATHS",
+        "/api/v1/status/,/api/v1/unauthorized/,/api/v1/forbidden/,"
+        "/api/v1/auth_session/login/",
+    ).split(",")
+    if path.strip() != ""
+])
 
 
 @app.errorhandler(404)
@@ -55,15 +64,7 @@ def forbidden(error) -> str:
 def before_request():
     """Handle before request actions"""
     if auth is not None:
-        if auth.require_auth(
-            request.path,
-            [
-                "/api/v1/status/",
-                "/api/v1/unauthorized/",
-                "/api/v1/forbidden/",
-                "/api/v1/auth_session/login/",
-            ],
-        ):
+        if auth.require_auth(request.path, excluded_paths):
             if (
                 auth.authorization_header(request) is None
                 and auth.session_cookie(request) is None
@@ -1,30 +1,63 @@
 #!/usr/bin/env python3
 """Auth route module for the API
 """
-from typing import List, TypeVar
+from typing import List, TypeVar, Union
 from flask import request
 from itsdangerous import exc
 import os
 
 
+class ExcludedPaths:
+    """Excluded paths compiled once into a set of exact paths, compared
+    without trailing slashes, and a trie of the prefixes of the paths
+    ending with `*`, so that matching a path costs O(path length)"""
+
+    def __init__(self, excluded_paths: List[str]) -> None:
+        """Compile a list of excluded paths"""
+        self.paths = list(excluded_paths)
+        self.exact = set()
+        self.prefixes = {}
+        for excluded_path in self.paths:
+            self.exact.add(excluded_path.rstrip("/"))
+            if excluded_path.endswith("*"):
+                node = self.prefixes
+                for char in excluded_path[:-1]:
+                    node = node.setdefault(char, {})
+                node[""] = True
+
+    def __len__(self) -> int:
+        """Return the number of excluded paths"""
+        return len(self.paths)
+
+    def match(self, path: str) -> bool:
+        """Check if a path is excluded"""
+        if path.rstrip("/") in self.exact:
+            return True
+        node = self.prefixes
+        if "" in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if "" in node:
+                return True
+        return False
+
+
 class Auth:
     """API Authentication class"""
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """Check if a route path requires auth"""
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExcludedPaths]
+                     ) -> bool:
+        """Check if a route path requires auth; pass the excluded paths
+        already compiled to check many paths against them"""
         if path is None or excluded_paths is None or len(excluded_paths) == 0:
             return True
-        if excluded_paths is None or len(excluded_paths) == 0:
-            return True
-        for excluded_path in excluded_paths:
-            if path.rstrip("/") == excluded_path.rstrip("/"):
-                return False
-            if excluded_path.endswith('*'):
-                if path.startswith(excluded_path[:-1]):
-                    return False
-            elif path == excluded_path:
-                return False
-        return True
+        if not isinstance(excluded_paths, ExcludedPaths):
+            excluded_paths = ExcludedPaths(excluded_paths)
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """Authorization header"""
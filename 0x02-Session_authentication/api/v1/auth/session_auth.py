@@ -2,6 +2,7 @@
 """Session Authentication module for the API
 """
 import uuid
+from typing import Tuple
 from api.v1.auth.auth import Auth
 from models.user import User
 
@@ -10,6 +11,8 @@ class SessionAuth(Auth):
     """API Session Auth"""
 
     user_id_by_session_id = {}
+    # (created_at, session id) of the sessions that expire, in order
+    session_times = []
 
     def create_session(self, user_id: str = None) -> str:
         """Create a session id for a user id"""
@@ -46,3 +49,9 @@ class SessionAuth(Auth):
         del self.user_id_by_session_id[session_id]
 
         return True
+
+    def session_counts(self) -> Tuple[int, int]:
+        """Return the number of sessions and of sessions that haven't
+        expired"""
+        count = len(self.user_id_by_session_id)
+        return count, count
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 """Implements session authentication with database as storage"""
+from datetime import datetime, timedelta
+from typing import Tuple
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from models.user_session import UserSession
 
@@ -57,3 +59,12 @@ class SessionDBAuth(SessionExpAuth):
             return True
         except Exception:
             return False
+
+    def session_counts(self) -> Tuple[int, int]:
+        """Return the number of `UserSession` and of those that haven't
+        expired, from the counts maintained by the storage"""
+        count = UserSession.count()
+        if self.session_duration <= 0:
+            return count, count
+        limit = datetime.utcnow() - timedelta(seconds=self.session_duration)
+        return count, UserSession.count_range("created_at", limit)
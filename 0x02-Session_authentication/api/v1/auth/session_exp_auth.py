@@ -1,23 +1,31 @@
 #!/usr/bin/env python3
 """This module implements session authentication with expiration
 for session id"""
+from bisect import bisect_left, insort
 from datetime import datetime, timedelta
+from typing import Tuple
 import os
 from api.v1.auth.session_auth import SessionAuth
 
 
+def session_duration() -> int:
+    """Return the session duration in seconds from `SESSION_DURATION`,
+    0 for sessions that never expire"""
+    duration = os.getenv("SESSION_DURATION", 0)
+
+    try:
+        return int(duration)
+    except (ValueError, TypeError):
+        return 0
+
+
 class SessionExpAuth(SessionAuth):
     """Session auth with expiration"""
 
     def __init__(self) -> None:
         """Initialize an instance of this class"""
         super().__init__()
-        duration = os.getenv("SESSION_DURATION", 0)
-
-        try:
-            self.session_duration = int(duration)
-        except (ValueError, TypeError):
-            self.session_duration = 0
+        self.session_duration = session_duration()
 
     def create_session(self, user_id=None):
         """Create a session id for a user id"""
@@ -26,6 +34,7 @@ class SessionExpAuth(SessionAuth):
             return None
         session_dict = {"user_id": user_id, "created_at": datetime.now()}
         self.user_id_by_session_id[session_id] = session_dict
+        insort(self.session_times, (session_dict["created_at"], session_id))
         return session_id
 
     def user_id_for_session_id(self, session_id=None):
@@ -48,3 +57,28 @@ class SessionExpAuth(SessionAuth):
             return None
 
         return session_dict['user_id']
+
+    def destroy_session(self, request=None):
+        """Deletes the user session and its creation time"""
+        session_id = self.session_cookie(request)
+        session_dict = self.user_id_by_session_id.get(session_id)
+        if not super().destroy_session(request):
+            return False
+        if isinstance(session_dict, dict) and \
+                session_dict.get("created_at") is not None:
+            key = (session_dict["created_at"], session_id)
+            position = bisect_left(self.session_times, key)
+            if self.session_times[position:position + 1] == [key]:
+                del self.session_times[position]
+        return True
+
+    def session_counts(self) -> Tuple[int, int]:
+        """Return the number of sessions and of sessions that haven't
+        expired, found by bisecting the sorted creation times"""
+        count = len(self.user_id_by_session_id)
+        if self.session_duration <= 0:
+            return count, count
+        limit = datetime.now() - timedelta(seconds=self.session_duration)
+        active = len(self.session_times) - \
+            bisect_left(self.session_times, (limit,))
+        return count, active
@@ -19,11 +19,21 @@ def stats() -> str:
     """GET /api/v1/stats
     Return:
       - the number of each objects
+      - the number of users created per day
+      - the number of sessions and of sessions that haven't expired,
+        kept by the session auth in use, else of `UserSession`
     """
+    from api.v1.app import auth
+    from api.v1.auth.session_auth import SessionAuth
+    from api.v1.auth.session_db_auth import SessionDBAuth
     from models.user import User
 
     stats = {}
     stats["users"] = User.count()
+    stats["users_per_day"] = User.histogram("created_at")
+    if not isinstance(auth, SessionAuth):
+        auth = SessionDBAuth()
+    stats["sessions"], stats["active_sessions"] = auth.session_counts()
     return jsonify(stats)
 
 
@@ -2,18 +2,94 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from datetime import datetime
+from flask import Response, abort, jsonify, request, stream_with_context
 from models.user import User
 
 
+MAX_PAGE_SIZE = 1000
+MAX_BULK_SIZE = 10000
+
+
+def stream_users(page_size: int = MAX_PAGE_SIZE):
+    """ Yield all users as a JSON array, one page of users at a time
+    """
+    yield b"["
+    after = None
+    separator = b""
+    while True:
+        users = User.page(page_size, after)
+        for user in users:
+            yield separator + user.to_json_bytes()
+            separator = b","
+        if len(users) < page_size:
+            break
+        after = users[-1].id
+    yield b"]"
+
+
+def page_users(limit: int, after: str = None) -> Response:
+    """ Return a page of users, with a `Link` header to the next one
+    """
+    users = User.page(limit, after)
+    response = jsonify([user.to_json() for user in users])
+    if len(users) == limit:
+        response.headers["Link"] = '<{}?limit={}&after={}>; rel="next"'.format(
+            request.base_url, limit, users[-1].id
+        )
+    return response
+
+
+def conditional(etag: str, last_modified: datetime,
+                make_response) -> Response:
+    """ Return an empty 304 response if the client already holds the
+    representation tagged `etag`, else the one built by `make_response`
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response()
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, users are then ordered by ID
+      - after (optional): ID of the last user of the previous page
+      - stream (optional): `1`, `true`, `yes` or `on` to stream the whole
+        list page by page
     Return:
       - list of all User objects JSON represented
+      - a `Link` header to the next page when paginated
+      - 304 if the `If-None-Match` header holds the current ETag
+      - 400 if the limit is not a positive integer
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    version, last_modified = User.version()
+    stream = request.args.get("stream", "").lower()
+    if stream in ("1", "true", "yes", "on"):
+        return conditional(version, last_modified, lambda: Response(
+            stream_with_context(stream_users()), mimetype="application/json"
+        ))
+    if request.args.get("limit") is None:
+        return conditional(version, last_modified, lambda: jsonify(
+            [user.to_json() for user in User.all()]
+        ))
+
+    try:
+        limit = int(request.args.get("limit"))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return jsonify({'error': "limit must be a positive integer"}), 400
+    limit = min(limit, MAX_PAGE_SIZE)
+    return conditional(version, last_modified, lambda: page_users(
+        limit, request.args.get("after")
+    ))
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -23,6 +99,7 @@ def view_one_user(user_id: str = None) -> str:
       - User ID
     Return:
       - User object JSON represented
+      - 304 if the `If-None-Match` header holds the current ETag
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -35,7 +112,9 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return conditional(user.etag(), user.updated_at, lambda: jsonify(
+        user.to_json()
+    ))
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -94,6 +173,61 @@ def create_user() -> str:
     return jsonify({'error': error_msg}), 400
 
 
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    JSON body:
+      - list of users, each with the JSON body of POST /api/v1/users
+    Return:
+      - one result per user, in order: the User object JSON represented
+        or an error
+      - 400 if the body isn't a list of at most MAX_BULK_SIZE users
+    """
+    try:
+        rj = request.get_json()
+    except Exception as e:
+        rj = None
+    if type(rj) is not list:
+        return jsonify({'error': "Wrong format"}), 400
+    if len(rj) > MAX_BULK_SIZE:
+        return jsonify({
+            'error': "at most {} users per request".format(MAX_BULK_SIZE)
+        }), 400
+    results = []
+    users = []
+    for item in rj:
+        error_msg = None
+        if type(item) is not dict:
+            error_msg = "Wrong format"
+        elif item.get("email", "") == "":
+            error_msg = "email missing"
+        elif item.get("password", "") == "":
+            error_msg = "password missing"
+        if error_msg is None:
+            try:
+                user = User()
+                user.email = item.get("email")
+                user.password = item.get("password")
+                user.first_name = item.get("first_name")
+                user.last_name = item.get("last_name")
+                user.to_json_bytes()
+            except Exception as e:
+                error_msg = "Can't create User: {}".format(e)
+        if error_msg is not None:
+            results.append({'error': error_msg})
+            continue
+        results.append(user)
+        users.append(user)
+    try:
+        User.bulk_save(users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return jsonify([
+        result.to_json() if type(result) is User else result
+        for result in results
+    ]), 201
+
+
 @app_views.route('/users/<user_id>', methods=['PUT'], strict_slashes=False)
 def update_user(user_id: str = None) -> str:
     """ PUT /api/v1/users/:id
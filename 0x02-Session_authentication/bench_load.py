@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+""" Startup benchmark: time `User.load_from_file` for each snapshot format
+
+    ./bench_load.py 100000 1000000
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from models.user import User
+
+
+def write_users(count: int):
+    """ Write a JSON snapshot of `count` synthetic users
+    """
+    users = {}
+    for i in range(count):
+        user_id = str(uuid.uuid4())
+        users[user_id] = {
+            "id": user_id,
+            "created_at": "2023-01-01T00:00:00",
+            "updated_at": "2023-06-01T12:30:00",
+            "email": "user{}@hbtn.io".format(i),
+            "_password": "{:064x}".format(i),
+            "first_name": "First{}".format(i),
+            "last_name": "Last{}".format(i),
+        }
+    with open(User.storage.file_path(User, "json"), "w") as f:
+        json.dump(users, f)
+
+
+def time_load(file_format: str) -> float:
+    """ Return the seconds taken to load the snapshot in a format
+    """
+    User.file_format = file_format
+    start = time.perf_counter()
+    User.load_from_file()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        for size in sizes:
+            write_users(size)
+            User.storage.convert_file(User, "json", "binary")
+            for file_format in ("json", "binary"):
+                seconds = time_load(file_format)
+                file_path = User.storage.file_path(User)
+                print("{:>9,} users {:<6} {:>7.2f}s {:>8,} KB".format(
+                    size, file_format, seconds,
+                    os.path.getsize(file_path) // 1024
+                ))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+""" Memory report: bytes per stored object, slots versus a per-object dict
+
+    ./bench_memory.py 100000
+"""
+import sys
+import tracemalloc
+import uuid
+from models.user import User
+from models.user_session import UserSession
+
+
+class DictObject():
+    """ Same attributes as a model, stored in a per-object `__dict__`
+    """
+
+    def __init__(self, obj):
+        """ Copy the attributes of a model object
+        """
+        for key, value in obj.to_dict(True).items():
+            setattr(self, key, value)
+
+
+def bytes_per_object(factory, count: int) -> float:
+    """ Return the traced bytes allocated per object built by `factory`
+    """
+    tracemalloc.start()
+    objs = [factory(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return size / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    models = {
+        "User": lambda i: User(
+            id=str(uuid.uuid4()), email="user{}@hbtn.io".format(i),
+            _password="{:064x}".format(i), first_name="First{}".format(i),
+            last_name="Last{}".format(i),
+        ),
+        "UserSession": lambda i: UserSession(
+            id=str(uuid.uuid4()), user_id=str(uuid.uuid4()),
+            session_id=str(uuid.uuid4()),
+        ),
+    }
+    for name, factory in models.items():
+        slotted = bytes_per_object(factory, count)
+        with_dict = bytes_per_object(
+            lambda i: DictObject(factory(i)), count
+        )
+        print("{:<12} slots {:>5.0f} B/object   dict {:>5.0f} B/object".format(
+            name, slotted, with_dict
+        ))
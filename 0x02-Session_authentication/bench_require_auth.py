@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+""" Micro-benchmark of `Auth.require_auth`: excluded paths checked one
+by one versus compiled once into `ExcludedPaths`
+
+    ./bench_require_auth.py 500 100000
+"""
+import sys
+import time
+from api.v1.auth.auth import Auth, ExcludedPaths
+
+
+def require_auth_loop(path: str, excluded_paths: list) -> bool:
+    """ Reference: check the excluded paths one by one
+    """
+    for excluded_path in excluded_paths:
+        if path.rstrip("/") == excluded_path.rstrip("/"):
+            return False
+        if excluded_path.endswith('*'):
+            if path.startswith(excluded_path[:-1]):
+                return False
+        elif path == excluded_path:
+            return False
+    return True
+
+
+def make_rules(count: int) -> list:
+    """ Return `count` excluded paths, every third one a wildcard
+    """
+    return [
+        "/api/v1/public{}/*".format(i) if i % 3 == 0
+        else "/api/v1/open{}/".format(i)
+        for i in range(count)
+    ]
+
+
+def make_paths(count: int) -> list:
+    """ Return a mix of excluded and protected request paths
+    """
+    return [
+        "/api/v1/public{}/files/report.pdf".format(count - 3),
+        "/api/v1/open{}".format(count - 1),
+        "/api/v1/open{}/".format(count // 2 + 1),
+        "/api/v1/users/me",
+        "/api/v1/stats/",
+        "/api/v1/public/",
+    ]
+
+
+def time_checks(check, paths: list, iterations: int) -> float:
+    """ Return the microseconds taken per path check
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for path in paths:
+            check(path)
+    return (time.perf_counter() - start) / (iterations * len(paths)) * 1e6
+
+
+if __name__ == "__main__":
+    rules = make_rules(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    paths = make_paths(len(rules))
+    auth = Auth()
+    compiled = ExcludedPaths(rules)
+    for path in paths:
+        assert auth.require_auth(path, compiled) == \
+            require_auth_loop(path, rules), path
+    loop = time_checks(lambda p: require_auth_loop(p, rules), paths,
+                       iterations)
+    matcher = time_checks(lambda p: auth.require_auth(p, compiled), paths,
+                          iterations)
+    print("{} rules: loop {:.2f} us/check, compiled {:.2f} us/check".format(
+        len(rules), loop, matcher
+    ))
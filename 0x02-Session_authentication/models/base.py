@@ -2,38 +2,89 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Tuple
+from os import getenv
+import hashlib
 import json
 import uuid
+from models.storage import (
+    FILE_FORMAT, PERSISTENCE, WRITE_BEHIND, FileStorage, SQLiteStorage
+)
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+STORAGE = getenv("MODELS_STORAGE", "file")
+SQLITE_PATH = getenv("MODELS_SQLITE_PATH", ".db.sqlite3")
 
 
 class Base():
     """ Base class
+
+    Attributes live in `__slots__`; a subclass that declares its own
+    `__slots__` has no per-object `__dict__`, one without keeps one.
+    Loading, queries and writes go through the `storage` backend.
     """
 
+    __slots__ = ("id", "created_at", "updated_at", "_cache")
+    slot_names = ("id", "created_at", "updated_at")
+    public_slot_names = slot_names
+    has_dict = False
+    indexed_attributes = ()
+    sorted_attributes = ("id", "created_at")
+    histogram_attributes = ("created_at",)
+    storage = (
+        SQLiteStorage(SQLITE_PATH, TIMESTAMP_FORMAT) if STORAGE == "sqlite"
+        else FileStorage()
+    )
+    persistence = PERSISTENCE
+    file_format = FILE_FORMAT
+    write_behind = WRITE_BEHIND
+
+    def __init_subclass__(cls, **kwargs: dict):
+        """ Collect the slot names of the class and its bases
+        """
+        super().__init_subclass__(**kwargs)
+        cls.slot_names = tuple(
+            name for klass in reversed(cls.__mro__)
+            for name in klass.__dict__.get("__slots__", ())
+            if name != "_cache"
+        )
+        cls.public_slot_names = tuple(
+            name for name in cls.slot_names if name[0] != '_'
+        )
+        cls.has_dict = cls.__dictoffset__ != 0
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute and drop the cached serializations
+
+        Constructors set their attributes with `object.__setattr__`,
+        as a new object has nothing cached.
+        """
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_cache", None)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.updated_at = datetime.utcnow()
+        set_attribute = object.__setattr__
+        set_attribute(self, "_cache", None)
+        set_attribute(self, "id", kwargs['id'] if 'id' in kwargs
+                      else str(uuid.uuid4()))
+        set_attribute(self, "created_at",
+                      self._timestamp(kwargs.get('created_at')))
+        set_attribute(self, "updated_at",
+                      self._timestamp(kwargs.get('updated_at')))
+
+    @staticmethod
+    def _timestamp(value) -> datetime:
+        """ Parse a stored timestamp, which is either a string in
+        `TIMESTAMP_FORMAT` or an already parsed datetime
+        """
+        if value is None:
+            return datetime.utcnow()
+        if type(value) is str:
+            return datetime.strptime(value, TIMESTAMP_FORMAT)
+        return value
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -44,69 +95,125 @@ class Base():
             return False
         return (self.id == other.id)
 
-    def to_json(self, for_serialization: bool = False) -> dict:
-        """ Convert the object a JSON dictionary
+    def to_dict(self, for_serialization: bool = False) -> dict:
+        """ Return the attributes of the object, datetimes unconverted
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
+        keys = self.slot_names if for_serialization \
+            else self.public_slot_names
+        result = {key: getattr(self, key, None) for key in keys}
+        if self.has_dict:
+            for key, value in self.__dict__.items():
+                if for_serialization or key[0] != '_':
+                    result[key] = value
+        return result
+
+    def _cached(self) -> dict:
+        """ Return the serialization cache, valid until the next
+        attribute assignment
+        """
+        cache = getattr(self, "_cache", None)
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, "_cache", cache)
+        return cache
+
+    def _json_dict(self, for_serialization: bool = False) -> dict:
+        """ Return the cached JSON dictionary, or build one without
+        caching it
+        """
+        cache = getattr(self, "_cache", None)
+        if cache is not None and for_serialization in cache:
+            return cache[for_serialization]
+        result = self.to_dict(for_serialization)
+        for key, value in result.items():
             if type(value) is datetime:
                 result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
         return result
 
+    def to_json(self, for_serialization: bool = False) -> dict:
+        """ Convert the object a JSON dictionary
+        """
+        cache = self._cached()
+        if for_serialization not in cache:
+            cache[for_serialization] = self._json_dict(for_serialization)
+        return dict(cache[for_serialization])
+
+    def to_json_bytes(self) -> bytes:
+        """ Return the encoded JSON representation of the object
+        """
+        cache = self._cached()
+        if "bytes" not in cache:
+            cache["bytes"] = json.dumps(self.to_json()).encode()
+        return cache["bytes"]
+
+    def etag(self) -> str:
+        """ Return a strong entity tag of the JSON representation
+        """
+        cache = self._cached()
+        if "etag" not in cache:
+            cache["etag"] = hashlib.sha1(self.to_json_bytes()).hexdigest()
+        return cache["etag"]
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from the storage of the class
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        cls.storage.load(cls)
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Write all objects of the class to its storage at once
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        cls.storage.checkpoint(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.storage.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        self.storage.remove(self)
+
+    @classmethod
+    def bulk_save(cls, objs: Iterable[TypeVar('Base')]):
+        """ Save objects of the class, persisting them in a single write
+        instead of one per object
+        """
+        objs = list(objs)
+        now = datetime.utcnow()
+        for obj in objs:
+            obj.updated_at = now
+        cls.storage.save_many(cls, objs)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return cls.storage.count(cls)
+
+    @classmethod
+    def version(cls) -> Tuple[str, datetime]:
+        """ Return a version of all objects, which changes on every
+        save or removal, and the time of the last change
+        """
+        return cls.storage.version(cls)
+
+    @classmethod
+    def count_range(cls, attribute: str, low=None, high=None) -> int:
+        """ Count the objects whose attribute is at least `low` and below
+        `high`, either one None for no bound
+        """
+        return cls.storage.count_range(cls, attribute, low, high)
+
+    @classmethod
+    def histogram(cls, attribute: str = "created_at") -> dict:
+        """ Return the number of objects per day (ISO date) of a datetime
+        attribute declared in `histogram_attributes`
+        """
+        return cls.storage.histogram(cls, attribute)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,24 +221,40 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, limit: int, after: str = None) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects ordered by ID, starting after
+        the object with the ID `after`
+        """
+        return cls.storage.page(cls, limit, after)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return cls.storage.get(cls, id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
-        """ Search all objects with matching attributes
-        """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+    def search(cls, attributes: dict = {}, limit: int = None,
+               order_by: str = None, prefix: dict = None,
+               range: dict = None) -> List[TypeVar('Base')]:
+        """ Search all objects with matching attributes, see `query`
+        """
+        return list(cls.query(attributes, limit, order_by, prefix, range))
+
+    @classmethod
+    def query(cls, where: dict = {}, limit: int = None,
+              order_by: str = None, prefix: dict = None,
+              range: dict = None) -> Iterator[TypeVar('Base')]:
+        """ Lazily yield the objects matching every condition
+
+        `where` maps attributes to the values they must equal, `prefix`
+        to the string they must start with and `range` to a
+        `(low, high)` pair they must fall in, `low` included and `high`
+        excluded, either one None for no bound. `order_by` names an
+        attribute, prefixed with "-" for a descending order, unset
+        values coming first. Iteration stops after `limit` objects.
+        """
+        return cls.storage.query(
+            cls, where, limit, order_by, prefix, range
+        )
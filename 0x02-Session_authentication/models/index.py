@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+""" Index module
+
+In-memory indexes of the objects of a class, kept by the file backend
+of `models.storage`.
+"""
+from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Iterator, TypeVar
+
+
+class Index():
+    """ Hash index of the saved objects of a class on one attribute
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty index
+        """
+        self.attribute = attribute
+        self.entries = {}
+        self.values = {}
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index an object under its current attribute value
+        """
+        value = getattr(obj, self.attribute, None)
+        if obj.id in self.values and self.values[obj.id] == value:
+            self.entries[value][obj.id] = obj
+            return
+        self.discard(obj.id)
+        try:
+            self.entries.setdefault(value, {})[obj.id] = obj
+        except TypeError:
+            return
+        self.values[obj.id] = value
+
+    def discard(self, obj_id: str):
+        """ Remove an object from the index
+        """
+        if obj_id not in self.values:
+            return
+        value = self.values.pop(obj_id)
+        del self.entries[value][obj_id]
+        if len(self.entries[value]) == 0:
+            del self.entries[value]
+
+    def lookup(self, value) -> Iterable[TypeVar('Base')]:
+        """ Return the objects indexed under a value
+        """
+        return list(self.entries.get(value, {}).values())
+
+
+class SortedIndex():
+    """ Index of the saved objects of a class ordered on one attribute,
+    ties broken by ID
+
+    Values are ordered by `sort_key`, so that values of types that can't
+    be compared with each other, such as a number among strings, are
+    grouped by type instead of failing. A value that can't be compared
+    with the others of its type is left out, like an unset one.
+
+    The keys are only sorted on first use: until then, `values` alone is
+    kept up to date, so that loading a class doesn't pay for the sorted
+    indexes no request reads.
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty index
+        """
+        self.attribute = attribute
+        self._keys = []
+        self.values = {}
+
+    @property
+    def keys(self) -> list:
+        """ Return the sorted `(sort_key(value), id)` keys, sorting them
+        if they aren't yet
+        """
+        self.sort()
+        return self._keys
+
+    @staticmethod
+    def sort_key(value) -> tuple:
+        """ Return the key ordering a value: numbers first, then the
+        values of every other type grouped by type name
+        """
+        if isinstance(value, (int, float)):
+            return ("", value)
+        return (type(value).__name__, value)
+
+    def _key(self, key: tuple) -> tuple:
+        """ Convert a `(value,)` or `(value, id)` key to its stored form
+        """
+        return (self.sort_key(key[0]),) + key[1:]
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index an object under its current attribute value
+        """
+        value = getattr(obj, self.attribute, None)
+        if obj.id in self.values and self.values[obj.id] == value:
+            return
+        self.discard(obj.id)
+        if value is None:
+            return
+        if self._keys is None:
+            self.values[obj.id] = value
+            return
+        try:
+            insort(self._keys, (self.sort_key(value), obj.id))
+        except TypeError:
+            return
+        self.values[obj.id] = value
+
+    def discard(self, obj_id: str):
+        """ Remove an object from the index
+        """
+        if obj_id not in self.values:
+            return
+        value = self.values.pop(obj_id)
+        if self._keys is not None:
+            key = self._key((value, obj_id))
+            del self._keys[bisect_left(self._keys, key)]
+
+    def ids(self, after: tuple = None) -> Iterator[str]:
+        """ Yield the IDs in order, starting after the key
+        `(value, id)` `after`
+        """
+        position = 0 if after is None else \
+            bisect_right(self.keys, self._key(after))
+        while position < len(self.keys):
+            yield self.keys[position][1]
+            position += 1
+
+    def count(self, low=None, high=None) -> int:
+        """ Return the number of objects whose value is at least `low`
+        and below `high`, either one None for no bound
+        """
+        begin = 0 if low is None else \
+            bisect_left(self.keys, self._key((low,)))
+        end = len(self.keys) if high is None else \
+            bisect_left(self.keys, self._key((high,)))
+        return max(end - begin, 0)
+
+    def build(self, objs: Iterable[TypeVar('Base')]):
+        """ Replace the content of the index, sorted on first use
+        """
+        attribute = self.attribute
+        self.values = {}
+        for obj in objs:
+            value = getattr(obj, attribute, None)
+            if value is not None:
+                self.values[obj.id] = value
+        self._keys = None
+
+    def sort(self):
+        """ Sort the keys of `values` if they aren't yet, at once instead
+        of inserting them one by one
+        """
+        if self._keys is not None:
+            return
+        keys = [
+            (self.sort_key(value), obj_id)
+            for obj_id, value in self.values.items()
+        ]
+        try:
+            keys.sort()
+        except TypeError:
+            values, self.values, self._keys = self.values, {}, []
+            for obj_id, value in values.items():
+                try:
+                    insort(self._keys, (self.sort_key(value), obj_id))
+                except TypeError:
+                    continue
+                self.values[obj_id] = value
+            return
+        self._keys = keys
+
+    def scan(self, lock, start: tuple = None, stop: tuple = None,
+             reverse: bool = False, size: int = 256) -> Iterator[str]:
+        """ Yield the IDs of the keys from `start` (included) to `stop`
+        (excluded), in order or in reverse
+
+        Keys are read `size` at a time while holding `lock`, so the
+        index can change between two chunks.
+        """
+        last = None
+        start = None if start is None else self._key(start)
+        stop = None if stop is None else self._key(stop)
+        while True:
+            with lock:
+                begin = 0 if start is None else bisect_left(self.keys, start)
+                end = len(self.keys)
+                if stop is not None:
+                    end = bisect_left(self.keys, stop)
+                if reverse:
+                    if last is not None:
+                        end = min(end, bisect_left(self.keys, last))
+                    chunk = self.keys[max(begin, end - size):end][::-1]
+                else:
+                    if last is not None:
+                        begin = max(begin, bisect_right(self.keys, last))
+                    chunk = self.keys[begin:min(end, begin + size)]
+            if len(chunk) == 0:
+                return
+            for key in chunk:
+                yield key[1]
+            last = chunk[-1]
+
+
+class Histogram():
+    """ Number of saved objects of a class per day of a datetime
+    attribute
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty histogram
+        """
+        self.attribute = attribute
+        self.counts = {}
+        self.values = {}
+
+    def add(self, obj: TypeVar('Base')):
+        """ Count an object under the day of its current attribute value
+        """
+        value = getattr(obj, self.attribute, None)
+        day = value.date().isoformat() if type(value) is datetime else None
+        if self.values.get(obj.id) == day:
+            return
+        self.discard(obj.id)
+        if day is None:
+            return
+        self.counts[day] = self.counts.get(day, 0) + 1
+        self.values[obj.id] = day
+
+    def discard(self, obj_id: str):
+        """ Stop counting an object
+        """
+        if obj_id not in self.values:
+            return
+        day = self.values.pop(obj_id)
+        self.counts[day] -= 1
+        if self.counts[day] == 0:
+            del self.counts[day]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+""" Binary snapshot module
+
+Column-oriented, versioned file format for `Base` snapshots. Datetime
+columns are stored as packed 64-bit integers (seconds since the epoch),
+so loading does not parse timestamp strings; every other column is one
+JSON array.
+
+Layout: header `MAGIC, VERSION, count` then length-prefixed blocks:
+the column table, the ids, then one block per column.
+"""
+from array import array
+from datetime import datetime, timedelta
+from typing import BinaryIO, Iterator, List
+import json
+import struct
+import sys
+
+
+MAGIC = b"BDB\x00"
+VERSION = 1
+HEADER = struct.Struct("<4sHQ")
+BLOCK = struct.Struct("<Q")
+EPOCH = datetime(1970, 1, 1)
+NULL_TIMESTAMP = -2 ** 63
+
+
+def _write_block(f: BinaryIO, data: bytes):
+    """ Write one length-prefixed block
+    """
+    f.write(BLOCK.pack(len(data)))
+    f.write(data)
+
+
+def _read_block(f: BinaryIO) -> bytes:
+    """ Read one length-prefixed block
+    """
+    size, = BLOCK.unpack(f.read(BLOCK.size))
+    return f.read(size)
+
+
+def _pack_timestamps(values: List[datetime]) -> bytes:
+    """ Pack datetimes as little-endian 64-bit seconds since the epoch
+    """
+    packed = array("q", (
+        NULL_TIMESTAMP if value is None
+        else (value - EPOCH) // timedelta(seconds=1)
+        for value in values
+    ))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_timestamps(data: bytes) -> List[datetime]:
+    """ Unpack datetimes packed by `_pack_timestamps`
+    """
+    packed = array("q")
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return [
+        None if value == NULL_TIMESTAMP else EPOCH + timedelta(seconds=value)
+        for value in packed
+    ]
+
+
+def dump(records: List[dict], f: BinaryIO):
+    """ Write records (attribute dicts with an `id`) to a binary file
+    """
+    names = {}
+    for record in records:
+        for key in record:
+            if key != "id":
+                names.setdefault(key, None)
+    columns = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        is_timestamp = all(
+            value is None or type(value) is datetime for value in values
+        ) and any(value is not None for value in values)
+        columns.append((name, "timestamp" if is_timestamp else "json",
+                        values))
+
+    f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+    _write_block(f, json.dumps(
+        [[name, kind] for name, kind, _ in columns]
+    ).encode())
+    _write_block(f, json.dumps(
+        [record["id"] for record in records]
+    ).encode())
+    for _, kind, values in columns:
+        if kind == "timestamp":
+            _write_block(f, _pack_timestamps(values))
+        else:
+            _write_block(f, json.dumps(values).encode())
+
+
+def load(f: BinaryIO) -> Iterator[dict]:
+    """ Yield the records of a binary file written by `dump`
+    """
+    magic, version, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a binary snapshot")
+    if version != VERSION:
+        raise ValueError("unsupported snapshot version {}".format(version))
+    columns = json.loads(_read_block(f))
+    ids = json.loads(_read_block(f))
+    names = [name for name, _ in columns]
+    values = []
+    for _, kind in columns:
+        if kind == "timestamp":
+            values.append(_unpack_timestamps(_read_block(f)))
+        else:
+            values.append(json.loads(_read_block(f)))
+    for obj_id, row in zip(ids, zip(*values) if values else [()] * count):
+        record = dict(zip(names, row))
+        record["id"] = obj_id
+        yield record
@@ -0,0 +1,1197 @@
+#!/usr/bin/env python3
+""" Storage module
+
+Interface of the storage backends behind `models.base.Base`: the
+default file backend, which holds the objects in memory and persists
+them to files, and the SQLite backend.
+"""
+from datetime import datetime
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Tuple, TypeVar
+from os import getenv, path
+import atexit
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from models import snapshot
+from models.index import Histogram, Index, SortedIndex
+from models.store import ShardedStore
+
+
+PERSISTENCE = getenv("MODELS_PERSISTENCE", "snapshot")
+FILE_FORMAT = getenv("MODELS_FILE_FORMAT", "json")
+FILE_EXTENSIONS = {"json": "json", "binary": "bin"}
+JOURNAL_RATIO = float(getenv("MODELS_JOURNAL_RATIO", "1"))
+JOURNAL_MIN_SIZE = 64 * 1024
+WRITE_BEHIND = getenv("MODELS_WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL = float(getenv("MODELS_FLUSH_INTERVAL", "1"))
+FLUSH_THRESHOLD = int(getenv("MODELS_FLUSH_THRESHOLD", "1000"))
+RELOAD_INTERVAL = float(getenv("MODELS_RELOAD_INTERVAL", "1"))
+DATA = {}
+INDEXES = {}
+SORTED_INDEXES = {}
+HISTOGRAMS = {}
+FILE_SIZES = {}
+FILE_STATES = {}
+FILE_LOCK_DEPTHS = {}
+VERSIONS = {}
+DIRTY = {}
+DIRTY_CONDITION = threading.Condition()
+STORE_LOCK = threading.Lock()
+FLUSH_LOCK = threading.RLock()
+_flusher = None
+logger = logging.getLogger(__name__)
+
+
+class Storage():
+    """ Storage backend interface: every method takes the model class
+    or the object it works on
+    """
+
+    def load(self, cls):
+        """ Prepare the storage of a class, loading it if needed
+        """
+        raise NotImplementedError
+
+    def refresh(self, cls, force: bool = False):
+        """ Pick up the changes other processes made to a class, nothing
+        to do for a backend always read from the database
+        """
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by ID, or None
+        """
+        raise NotImplementedError
+
+    def query(self, cls, where: dict, limit: int = None,
+              order_by: str = None, prefixes: dict = None,
+              ranges: dict = None) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects matching the conditions of `Base.query`
+        """
+        raise NotImplementedError
+
+    def count(self, cls) -> int:
+        """ Return the number of stored objects
+        """
+        raise NotImplementedError
+
+    def count_range(self, cls, attribute: str, low=None, high=None) -> int:
+        """ Return the number of objects whose attribute is at least `low`
+        and below `high`
+        """
+        raise NotImplementedError
+
+    def histogram(self, cls, attribute: str) -> dict:
+        """ Return the number of objects per day of an attribute
+        declared in `histogram_attributes`
+        """
+        raise NotImplementedError
+
+    def page(self, cls, limit: int, after: str = None
+             ) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects ordered by ID, starting after
+        the ID `after`
+        """
+        raise NotImplementedError
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        raise NotImplementedError
+
+    def save_many(self, cls, objs: List[TypeVar('Base')]):
+        """ Insert or update objects of a class at once
+        """
+        raise NotImplementedError
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        raise NotImplementedError
+
+    def version(self, cls) -> Tuple[str, datetime]:
+        """ Return a version of the objects of a class, which changes on
+        every write, and the time of the last write
+        """
+        raise NotImplementedError
+
+    def flush(self, cls):
+        """ Write the pending mutations of a class, nothing to do for a
+        backend writing every mutation through
+        """
+
+    def checkpoint(self, cls):
+        """ Fold everything written for a class into its main file
+        """
+        raise NotImplementedError
+
+
+class FileStorage(Storage):
+    """ Default backend: objects held in `DATA` and indexed in memory,
+    persisted to the snapshot and journal files of their class
+    """
+
+    def store(self, cls) -> ShardedStore:
+        """ Return the store of a class, created empty with its indexes
+        if the class isn't loaded
+        """
+        s_class = cls.__name__
+        if DATA.get(s_class) is None:
+            with STORE_LOCK:
+                if DATA.get(s_class) is None:
+                    self.reset_indexes(cls)
+                    DATA[s_class] = ShardedStore()
+        return DATA[s_class]
+
+    def reset_indexes(self, cls):
+        """ Empty the indexes declared in `indexed_attributes`,
+        `sorted_attributes` and `histogram_attributes`
+        """
+        INDEXES[cls.__name__] = {
+            attribute: Index(attribute)
+            for attribute in cls.indexed_attributes
+        }
+        SORTED_INDEXES[cls.__name__] = {
+            attribute: SortedIndex(attribute)
+            for attribute in cls.sorted_attributes
+        }
+        HISTOGRAMS[cls.__name__] = {
+            attribute: Histogram(attribute)
+            for attribute in cls.histogram_attributes
+        }
+
+    def build_indexes(self, cls, objs: Iterable[TypeVar('Base')]):
+        """ Fill every index of the class with objects
+        """
+        s_class = cls.__name__
+        objs = list(objs)
+        with self.store(cls).index_lock:
+            self.reset_indexes(cls)
+            for obj in objs:
+                for index in INDEXES[s_class].values():
+                    index.add(obj)
+                for histogram in HISTOGRAMS[s_class].values():
+                    histogram.add(obj)
+            for index in SORTED_INDEXES[s_class].values():
+                index.build(objs)
+
+    def index(self, obj: TypeVar('Base')):
+        """ Add or update an object in every index of its class
+        """
+        cls = obj.__class__
+        s_class = cls.__name__
+        with self.store(cls).index_lock:
+            for index in INDEXES[s_class].values():
+                index.add(obj)
+            for index in SORTED_INDEXES[s_class].values():
+                index.add(obj)
+            for histogram in HISTOGRAMS[s_class].values():
+                histogram.add(obj)
+
+    def unindex(self, cls, obj_id: str):
+        """ Remove an object from every index of the class
+        """
+        s_class = cls.__name__
+        with self.store(cls).index_lock:
+            for index in INDEXES[s_class].values():
+                index.discard(obj_id)
+            for index in SORTED_INDEXES[s_class].values():
+                index.discard(obj_id)
+            for histogram in HISTOGRAMS[s_class].values():
+                histogram.discard(obj_id)
+
+    def load(self, cls):
+        """ Load all objects of a class from file
+
+        The snapshot is loaded first, then the journal is replayed on top,
+        holding the lock file so that no process writes meanwhile. A
+        partial record left at the end of the journal by a process that
+        died while appending is then cut off.
+        """
+        s_class = cls.__name__
+        file_path = self.file_path(cls)
+        journal_path = self.file_path(cls, "journal")
+        self.flush(cls)
+        with self.file_lock(cls):
+            journal = file_signature(journal_path)
+            state = {
+                "snapshot": file_signature(file_path),
+                "journal": journal and journal[0],
+                "offset": 0,
+                "checked": time.monotonic(),
+            }
+            FILE_STATES[s_class] = state
+            FILE_SIZES[s_class] = {"snapshot": 0, "journal": 0}
+            self.reset_indexes(cls)
+
+            DATA[s_class] = ShardedStore(self.read_snapshot(cls))
+            if state["snapshot"] is not None:
+                FILE_SIZES[s_class]["snapshot"] = state["snapshot"][1]
+            state["offset"] = self.replay_journal(cls)
+            FILE_SIZES[s_class]["journal"] = state["offset"]
+            if journal is not None and journal[1] > state["offset"]:
+                logger.warning("%s: cutting %d bytes of a partial record",
+                               journal_path, journal[1] - state["offset"])
+                os.truncate(journal_path, state["offset"])
+
+        objs = self.store(cls).values()
+        self.build_indexes(cls, objs)
+        VERSIONS[s_class] = {
+            "token": uuid.uuid4().hex,
+            "counter": 0,
+            "modified": max((obj.updated_at for obj in objs), default=None),
+        }
+
+    def touch(self, cls):
+        """ Record a change to the objects of a class
+        """
+        s_class = cls.__name__
+        with self.store(cls).index_lock:
+            version = VERSIONS.setdefault(
+                s_class, {"token": uuid.uuid4().hex, "counter": 0}
+            )
+            version["counter"] += 1
+            version["modified"] = datetime.utcnow()
+
+    def version(self, cls) -> Tuple[str, datetime]:
+        """ Return the version of the objects of a class and the time
+        they last changed
+
+        The version is a digest of the state of the files read, so that
+        every process that read the same files returns the same one.
+        While mutations wait for the write-behind flusher, or if the
+        class wasn't loaded, it is a token local to this process.
+        """
+        self.refresh(cls)
+        s_class = cls.__name__
+        self.store(cls)
+        with FLUSH_LOCK:
+            if s_class not in VERSIONS:
+                self.touch(cls)
+            version = VERSIONS[s_class]
+            state = FILE_STATES.get(s_class)
+            with DIRTY_CONDITION:
+                pending = bool(DIRTY.get(cls))
+            if state is None or pending:
+                token = "{}-{}".format(version["token"], version["counter"])
+            else:
+                token = hashlib.sha1(repr((
+                    state["snapshot"], state["journal"], state["offset"]
+                )).encode()).hexdigest()
+        return token, version["modified"]
+
+    def refresh(self, cls, force: bool = False):
+        """ Apply the changes other processes made to the files of a
+        loaded class
+
+        The files are stat'ed at most every `RELOAD_INTERVAL` seconds,
+        unless `force`. Only the journal records past the ones already
+        read are applied; the class is reloaded when the snapshot
+        changed or the journal was replaced, i.e. after a compaction.
+        """
+        state = FILE_STATES.get(cls.__name__)
+        now = time.monotonic()
+        if state is None or not force and (
+            RELOAD_INTERVAL < 0 or now - state["checked"] < RELOAD_INTERVAL
+        ):
+            return
+        with FLUSH_LOCK:
+            state["checked"] = now
+            journal = file_signature(self.file_path(cls, "journal"))
+            if file_signature(self.file_path(cls)) != state["snapshot"] or (
+                journal is None and state["offset"] > 0
+            ) or journal is not None and (
+                state["journal"] not in (None, journal[0])
+                or journal[1] < state["offset"]
+            ):
+                self.load(cls)
+            elif journal is not None and journal[1] > state["offset"]:
+                offset = state["offset"]
+                state["journal"] = journal[0]
+                state["offset"] = self.replay_journal(cls, offset, True)
+                if state["offset"] > offset:
+                    self.touch(cls)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store an object and persist the mutation
+
+        The object is indexed before being stored, so that a new object
+        an index fails on is neither stored nor left in any index.
+        """
+        cls = obj.__class__
+        store = self.store(cls)
+        with store.index_lock:
+            try:
+                self.index(obj)
+            except Exception:
+                if obj.id not in store:
+                    self.unindex(cls, obj.id)
+                raise
+            store[obj.id] = obj
+            self.touch(cls)
+            record = {"op": "save", "obj": obj.to_json(True)}
+        self.persist(cls, record)
+
+    def save_many(self, cls, objs: List[TypeVar('Base')]):
+        """ Store objects and persist the mutations at once
+
+        Every object is indexed and serialized before any is stored: if
+        one fails, the new objects are taken out of the indexes and none
+        of them is stored.
+        """
+        store = self.store(cls)
+        records = []
+        with store.index_lock:
+            try:
+                for obj in objs:
+                    self.index(obj)
+                    records.append({"op": "save", "obj": obj.to_json(True)})
+            except Exception:
+                for obj in objs:
+                    if obj.id not in store:
+                        self.unindex(cls, obj.id)
+                raise
+            for obj in objs:
+                store[obj.id] = obj
+            self.touch(cls)
+        if records:
+            self.persist(cls, *records)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object and persist the mutation
+        """
+        cls = obj.__class__
+        store = self.store(cls)
+        with store.index_lock:
+            removed = store.pop(obj.id, None) is not None
+            if removed:
+                self.unindex(cls, obj.id)
+                self.touch(cls)
+        if removed:
+            self.persist(cls, {"op": "remove", "id": obj.id})
+
+    def count(self, cls) -> int:
+        """ Count all objects
+        """
+        self.refresh(cls)
+        return len(self.store(cls))
+
+    def count_range(self, cls, attribute: str, low=None, high=None) -> int:
+        """ Count the objects whose attribute is at least `low` and below
+        `high`, with a sorted index when the attribute has one
+        """
+        self.refresh(cls)
+        store = self.store(cls)
+        index = SORTED_INDEXES[cls.__name__].get(attribute)
+        if index is None:
+            objs = self.query(cls, {}, ranges={attribute: (low, high)})
+            return sum(1 for _ in objs)
+        with store.index_lock:
+            return index.count(low, high)
+
+    def histogram(self, cls, attribute: str) -> dict:
+        """ Return the number of objects per day of an attribute
+        declared in `histogram_attributes`
+        """
+        self.refresh(cls)
+        store = self.store(cls)
+        with store.index_lock:
+            histogram = HISTOGRAMS[cls.__name__][attribute]
+            return dict(sorted(histogram.counts.items()))
+
+    def page(self, cls, limit: int, after: str = None
+             ) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects ordered by ID, starting after
+        the object with the ID `after`
+        """
+        self.refresh(cls)
+        store = self.store(cls)
+        objs = []
+        start = None if after is None else (after, after)
+        with store.index_lock:
+            for obj_id in SORTED_INDEXES[cls.__name__]["id"].ids(start):
+                if len(objs) == limit:
+                    break
+                objs.append(store[obj_id])
+        return objs
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by ID
+        """
+        self.refresh(cls)
+        return self.store(cls).get(obj_id)
+
+    def query(self, cls, where: dict, limit: int = None,
+              order_by: str = None, prefixes: dict = None,
+              ranges: dict = None) -> Iterator[TypeVar('Base')]:
+        """ Yield the matching objects
+
+        The candidates come from a hash index on an attribute of
+        `where` when there is one, else from a sorted index on the
+        `order_by`, prefix or range attribute, else from the
+        `created_at` sorted index, so that a full scan keeps the
+        creation order. Each candidate is then checked against every
+        condition, as of its current attributes.
+        """
+        self.refresh(cls)
+        s_class = cls.__name__
+        store = self.store(cls)
+        prefixes = prefixes or {}
+        ranges = ranges or {}
+        reverse = order_by is not None and order_by.startswith("-")
+        order = order_by.lstrip("-") if order_by else None
+        bounds = {}
+        for k, p in prefixes.items():
+            if p:
+                bounds[k] = (p, p[:-1] + chr(ord(p[-1]) + 1))
+        for k, (low, high) in ranges.items():
+            bounds[k] = (low, high)
+
+        def _match(obj):
+            try:
+                for k, v in where.items():
+                    if getattr(obj, k, None) != v:
+                        return False
+                for k, p in prefixes.items():
+                    value = getattr(obj, k, None)
+                    if type(value) is not str or not value.startswith(p):
+                        return False
+                for k, (low, high) in ranges.items():
+                    value = getattr(obj, k, None)
+                    if value is None or (low is not None and value < low) \
+                            or (high is not None and value >= high):
+                        return False
+            except TypeError:
+                return False
+            return True
+
+        def _scan(attribute):
+            index = SORTED_INDEXES[s_class][attribute]
+            low, high = bounds.get(attribute, (None, None))
+            ids = index.scan(
+                store.index_lock,
+                None if low is None else (low,),
+                None if high is None else (high,),
+                reverse
+            )
+            for obj_id in ids:
+                obj = store.get(obj_id)
+                if obj is not None:
+                    yield obj
+
+        def _ordered(attribute):
+            objs = _scan(attribute)
+            index = SORTED_INDEXES[s_class][attribute]
+            with store.index_lock:
+                index.sort()
+            if attribute not in bounds and len(index.values) < len(store):
+                unset = (
+                    obj for obj in store.values()
+                    if obj.id not in index.values
+                )
+                objs = chain(objs, unset) if reverse else chain(unset, objs)
+            return objs
+
+        def _sort(objs):
+            if order is None:
+                return objs
+            return sorted(objs, reverse=reverse, key=lambda obj: (
+                getattr(obj, order, None) is not None,
+                SortedIndex.sort_key(getattr(obj, order, None)), obj.id
+            ))
+
+        sorted_indexes = SORTED_INDEXES.get(s_class, {})
+        indexes = INDEXES.get(s_class, {})
+        objs = None
+        for k, v in where.items():
+            if k in indexes:
+                try:
+                    objs = _sort(indexes[k].lookup(v))
+                    break
+                except TypeError:
+                    continue
+        if objs is None and order in sorted_indexes:
+            objs = _ordered(order)
+        if objs is None:
+            for k in bounds:
+                if k in sorted_indexes:
+                    objs = _sort(_scan(k))
+                    break
+        if objs is None and order is None and "created_at" in sorted_indexes:
+            objs = _ordered("created_at")
+        if objs is None:
+            objs = _sort(store.values())
+        return islice(filter(_match, objs), limit)
+
+    def file_path(self, cls, extension: str = None) -> str:
+        """ Return the path of the journal file or of the snapshot file
+        in the `file_format` of the class
+        """
+        if extension is None:
+            extension = FILE_EXTENSIONS[cls.file_format]
+        return ".db_{}.{}".format(cls.__name__, extension)
+
+    def read_snapshot(self, cls, file_format: str = None) -> dict:
+        """ Return the objects of a snapshot file by ID
+
+        Without `file_format`, the snapshot in the `file_format` of the
+        class is read, or if it doesn't exist yet, the one in the other
+        format: a deployment switching formats keeps its objects, and
+        the next save writes them in the new format.
+        """
+        if file_format is None:
+            file_format = cls.file_format
+            others = [
+                other for other, extension in FILE_EXTENSIONS.items()
+                if path.exists(self.file_path(cls, extension))
+            ]
+            if not path.exists(self.file_path(cls)) and others:
+                logger.info("%s: no %s snapshot, reading the %s one",
+                            cls.__name__, file_format, others[0])
+                file_format = others[0]
+        file_path = self.file_path(cls, FILE_EXTENSIONS[file_format])
+        objs = {}
+        if not path.exists(file_path):
+            return objs
+        if file_format == "binary":
+            with open(file_path, 'rb') as f:
+                for obj_dict in snapshot.load(f):
+                    objs[obj_dict["id"]] = cls(**obj_dict)
+        else:
+            with open(file_path, 'r') as f:
+                for obj_id, obj_json in json.load(f).items():
+                    objs[obj_id] = cls(**obj_json)
+        return objs
+
+    def write_snapshot(self, cls, objs: dict, file_format: str = None) -> int:
+        """ Atomically replace a snapshot file, return its size
+        """
+        file_format = file_format or cls.file_format
+        file_path = self.file_path(cls, FILE_EXTENSIONS[file_format])
+        if file_format == "binary":
+            with open(file_path + ".tmp", 'wb') as f:
+                snapshot.dump(
+                    [obj.to_dict(True) for obj in objs.values()], f
+                )
+        else:
+            objs_json = {}
+            for obj_id, obj in objs.items():
+                objs_json[obj_id] = obj._json_dict(True)
+            with open(file_path + ".tmp", 'w') as f:
+                f.write(json.dumps(objs_json))
+        os.replace(file_path + ".tmp", file_path)
+        return path.getsize(file_path)
+
+    def convert_file(self, cls, source_format: str, target_format: str):
+        """ Rewrite the snapshot file of the class in another format
+        """
+        self.write_snapshot(
+            cls, self.read_snapshot(cls, source_format), target_format
+        )
+
+    @contextmanager
+    def file_lock(self, cls):
+        """ Hold the lock file of the class, which serializes the writes
+        of every process; reentrant for the thread holding `FLUSH_LOCK`
+        """
+        s_class = cls.__name__
+        with FLUSH_LOCK:
+            depth = FILE_LOCK_DEPTHS.get(s_class, 0)
+            FILE_LOCK_DEPTHS[s_class] = depth + 1
+            try:
+                if depth > 0:
+                    yield
+                else:
+                    with open(self.file_path(cls, "lock"), 'a') as f:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                        yield
+            finally:
+                FILE_LOCK_DEPTHS[s_class] = depth
+
+    def replay_journal(self, cls, offset: int = 0, index: bool = False) -> int:
+        """ Apply the journal records found after byte `offset`, return
+        the offset following the last complete record
+
+        A complete line that isn't a valid record is logged and skipped.
+        With `index`, the indexes are updated and the objects equal to
+        their record, such as the ones this process saved, are kept.
+        """
+        s_class = cls.__name__
+        store = self.store(cls)
+        try:
+            f = open(self.file_path(cls, "journal"), 'rb')
+        except FileNotFoundError:
+            return offset
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                    remove = record["op"] == "remove"
+                    obj_id = record["id"] if remove else record["obj"]["id"]
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("%s: skipping an invalid record at byte %d",
+                                   f.name, offset - len(line))
+                    continue
+                if remove:
+                    if store.pop(obj_id, None) is not None and index:
+                        self.unindex(cls, obj_id)
+                    continue
+                obj = store.get(obj_id)
+                if index and obj is not None and \
+                        obj._json_dict(True) == record["obj"]:
+                    continue
+                obj = cls(**record["obj"])
+                store[obj.id] = obj
+                if index:
+                    self.index(obj)
+        return offset
+
+    def checkpoint(self, cls):
+        """ Write all objects of a class to its snapshot file
+
+        The snapshot is replaced atomically and the journal, now folded
+        into it, is deleted. In journal mode, the records other processes
+        appended are applied first so that the snapshot includes them.
+        """
+        s_class = cls.__name__
+        journal_path = self.file_path(cls, "journal")
+        with FLUSH_LOCK, self.file_lock(cls):
+            if cls.persistence == "journal":
+                self.refresh(cls, True)
+            size = self.write_snapshot(cls, self.store(cls).snapshot())
+            if path.exists(journal_path):
+                os.remove(journal_path)
+            FILE_SIZES[s_class] = {"snapshot": size, "journal": 0}
+            FILE_STATES[s_class] = {
+                "snapshot": file_signature(self.file_path(cls)),
+                "journal": None,
+                "offset": 0,
+                "checked": time.monotonic(),
+            }
+
+    def append_to_journal(self, cls, *records: dict):
+        """ Append mutations to the journal file in a single write
+
+        When no other process appended since the last read, the records
+        are marked as read, else the journal is read up to them, so that
+        the files read match the objects held. A failed write is cut off
+        the journal, so that the records can be written again, and the
+        records start on a new line if the journal ends with a partial
+        one, left by a process that died while appending. The journal is
+        compacted into the snapshot once it grows past `JOURNAL_RATIO`
+        times the snapshot size.
+        """
+        s_class = cls.__name__
+        lines = "".join(
+            json.dumps(record) + "\n" for record in records
+        ).encode()
+        with FLUSH_LOCK, self.file_lock(cls):
+            with open(self.file_path(cls, "journal"), 'ab+', buffering=0) as f:
+                start = f.seek(0, os.SEEK_END)
+                if start > 0 and os.pread(f.fileno(), 1, start - 1) != b"\n":
+                    lines = b"\n" + lines
+                try:
+                    if f.write(lines) != len(lines):
+                        raise OSError("short write to the journal")
+                except BaseException:
+                    os.ftruncate(f.fileno(), start)
+                    raise
+                end = f.tell()
+                inode = os.fstat(f.fileno()).st_ino
+            state = FILE_STATES.get(s_class)
+            if state is not None and state["offset"] == end - len(lines):
+                state["journal"] = inode
+                state["offset"] = end
+            sizes = FILE_SIZES.setdefault(
+                s_class, {"snapshot": 0, "journal": 0}
+            )
+            sizes["journal"] += len(lines)
+            if sizes["journal"] > JOURNAL_RATIO * max(sizes["snapshot"],
+                                                      JOURNAL_MIN_SIZE):
+                self.checkpoint(cls)
+            elif state is not None and state["offset"] != end:
+                self.refresh(cls, True)
+
+    def persist(self, cls, *records: dict):
+        """ Write mutations to disk
+
+        In write-behind mode the class is only marked dirty; the
+        background flusher writes the pending mutations every
+        `FLUSH_INTERVAL` seconds or once `FLUSH_THRESHOLD` are queued.
+        """
+        if not cls.write_behind:
+            self.write_pending(cls, list(records))
+            return
+        with DIRTY_CONDITION:
+            DIRTY.setdefault(cls, []).extend(records)
+            if len(DIRTY[cls]) >= FLUSH_THRESHOLD:
+                DIRTY_CONDITION.notify()
+        start_flusher()
+
+    def write_pending(self, cls, records: List[dict]):
+        """ Write mutations with the persistence mode of the class
+        """
+        if cls.persistence == "journal":
+            self.append_to_journal(cls, *records)
+        else:
+            self.checkpoint(cls)
+
+    def flush(self, cls):
+        """ Write the pending mutations of the class to disk, queued
+        again in front of the newer ones if the write fails
+        """
+        with FLUSH_LOCK:
+            with DIRTY_CONDITION:
+                records = DIRTY.pop(cls, None)
+            if records:
+                try:
+                    self.write_pending(cls, records)
+                except BaseException:
+                    with DIRTY_CONDITION:
+                        DIRTY[cls] = records + DIRTY.get(cls, [])
+                    raise
+
+
+class SQLiteStorage(Storage):
+    """ SQLite backend: one table per class, holding each object as
+    JSON plus one indexed column per indexed or sorted attribute
+    """
+
+    def __init__(self, db_path: str, timestamp_format: str):
+        """ Initialize the backend, connections are opened per thread
+        """
+        self.db_path = db_path
+        self.timestamp_format = timestamp_format
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ Return the connection of the current thread
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def columns(cls) -> List[str]:
+        """ Return the attributes of a class stored in their own column
+        """
+        columns = []
+        for attribute in cls.indexed_attributes + cls.sorted_attributes + \
+                cls.histogram_attributes:
+            if attribute != "id" and attribute not in columns:
+                columns.append(attribute)
+        return columns
+
+    def value(self, value):
+        """ Convert an attribute value to its stored form
+        """
+        if type(value) is datetime:
+            return value.strftime(self.timestamp_format)
+        return value
+
+    def load(self, cls):
+        """ Create the table and indexes of a class if they are missing
+        """
+        table = cls.__name__
+        columns = self.columns(cls)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS "_versions" ('
+            'name TEXT PRIMARY KEY, token TEXT, version INTEGER, '
+            'modified TEXT)'
+        )
+        self._seed_version(cls)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS "{}" ('
+            'id TEXT PRIMARY KEY, data TEXT NOT NULL{})'.format(
+                table, "".join(', "{}"'.format(c) for c in columns)
+            )
+        )
+        existing = [
+            row[1] for row in
+            self.connection.execute('PRAGMA table_info("{}")'.format(table))
+        ]
+        for column in columns:
+            if column not in existing:
+                self.connection.execute(
+                    'ALTER TABLE "{}" ADD COLUMN "{}"'.format(table, column)
+                )
+                self.connection.execute(
+                    'UPDATE "{}" SET "{}" = json_extract(data, ?)'.format(
+                        table, column
+                    ),
+                    ("$.{}".format(column),)
+                )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'
+                .format(table, column)
+            )
+        self._create_counts(cls)
+
+    def _create_counts(self, cls):
+        """ Create the triggers maintaining the counts of a class in the
+        `_counts` table, then rebuild them
+
+        The total is kept under the key "*" and the histograms under
+        "attribute:day", the day being the date part of the timestamp.
+        """
+        table = cls.__name__
+        connection = self.connection
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS "_counts" (name TEXT, key TEXT, '
+            'count INTEGER, PRIMARY KEY (name, key))'
+        )
+
+        def _add(key: str, count: int) -> str:
+            return 'INSERT INTO "_counts" VALUES (\'{}\', {}, {}) ' \
+                'ON CONFLICT(name, key) DO UPDATE ' \
+                'SET count = count + excluded.count;'.format(table, key, count)
+
+        def _day(attribute: str, row: str) -> str:
+            return "'{0}:' || coalesce(substr({1}.\"{0}\", 1, 10), '')" \
+                .format(attribute, row)
+
+        attributes = cls.histogram_attributes
+        for event, row, count in (("insert", "NEW", 1), ("delete", "OLD", -1)):
+            statements = [_add("'*'", count)] + [
+                _add(_day(attribute, row), count) for attribute in attributes
+            ]
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS "{0}_count_{1}" AFTER {1} '
+                'ON "{0}" BEGIN {2} END'.format(
+                    table, event, " ".join(statements)
+                )
+            )
+        for attribute in attributes:
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS "{0}_count_{1}" AFTER UPDATE OF '
+                '"{1}" ON "{0}" WHEN OLD."{1}" IS NOT NEW."{1}" '
+                'BEGIN {2} {3} END'.format(
+                    table, attribute, _add(_day(attribute, "OLD"), -1),
+                    _add(_day(attribute, "NEW"), 1)
+                )
+            )
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                'DELETE FROM "_counts" WHERE name = ?', (table,)
+            )
+            connection.execute(
+                'INSERT INTO "_counts" SELECT ?, \'*\', COUNT(*) FROM "{}"'
+                .format(table), (table,)
+            )
+            for attribute in attributes:
+                connection.execute(
+                    'INSERT INTO "_counts" SELECT ?, {}, COUNT(*) FROM "{}" '
+                    'GROUP BY 2'.format(_day(attribute, table), table),
+                    (table,)
+                )
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _objects(self, cls, query: str, params: tuple = ()
+                 ) -> List[TypeVar('Base')]:
+        """ Run a query selecting `data` and build the objects
+        """
+        return [
+            cls(**json.loads(row[0]))
+            for row in self.connection.execute(query, params)
+        ]
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by ID, or None
+        """
+        objs = self._objects(
+            cls, 'SELECT data FROM "{}" WHERE id = ?'.format(cls.__name__),
+            (obj_id,)
+        )
+        return objs[0] if objs else None
+
+    def _expression(self, cls, attribute: str, params: list) -> str:
+        """ Return the SQL expression of an attribute, adding its
+        parameters to `params`
+        """
+        if attribute == "id" or attribute in self.columns(cls):
+            return '"{}"'.format(attribute)
+        params.append("$.{}".format(attribute))
+        return "json_extract(data, ?)"
+
+    def query(self, cls, where: dict, limit: int = None,
+              order_by: str = None, prefixes: dict = None,
+              ranges: dict = None) -> Iterator[TypeVar('Base')]:
+        """ Yield the matching objects, in insertion order unless
+        `order_by` is given
+        """
+        conditions = []
+        params = []
+        for key, value in where.items():
+            conditions.append(
+                "{} IS ?".format(self._expression(cls, key, params))
+            )
+            params.append(self.value(value))
+        bounds = list((ranges or {}).items())
+        for key, prefix in (prefixes or {}).items():
+            if prefix:
+                bounds.append(
+                    (key, (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+                )
+            else:
+                conditions.append("typeof({}) = 'text'".format(
+                    self._expression(cls, key, params)
+                ))
+        for key, (low, high) in bounds:
+            if low is not None:
+                conditions.append("{} >= ?".format(
+                    self._expression(cls, key, params)
+                ))
+                params.append(self.value(low))
+            if high is not None:
+                conditions.append("{} < ?".format(
+                    self._expression(cls, key, params)
+                ))
+                params.append(self.value(high))
+        query = 'SELECT data FROM "{}"'.format(cls.__name__)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            direction = "DESC" if order_by.startswith("-") else "ASC"
+            query += " ORDER BY {0} {1}, id {1}".format(
+                self._expression(cls, order_by.lstrip("-"), params),
+                direction
+            )
+        else:
+            query += " ORDER BY rowid"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        for row in self.connection.execute(query, params):
+            yield cls(**json.loads(row[0]))
+
+    def count(self, cls) -> int:
+        """ Return the number of stored objects, kept up to date by the
+        triggers of the class
+        """
+        row = self.connection.execute(
+            'SELECT count FROM "_counts" WHERE name = ? AND key = \'*\'',
+            (cls.__name__,)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def count_range(self, cls, attribute: str, low=None, high=None) -> int:
+        """ Return the number of objects whose attribute is at least `low`
+        and below `high`, counted on the index of the attribute
+        """
+        conditions = []
+        params = []
+        if low is not None:
+            conditions.append(
+                "{} >= ?".format(self._expression(cls, attribute, params))
+            )
+            params.append(self.value(low))
+        if high is not None:
+            conditions.append(
+                "{} < ?".format(self._expression(cls, attribute, params))
+            )
+            params.append(self.value(high))
+        if not conditions:
+            conditions.append(
+                "{} IS NOT NULL".format(
+                    self._expression(cls, attribute, params)
+                )
+            )
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM "{}" WHERE {}'.format(
+                cls.__name__, " AND ".join(conditions)
+            ), params
+        ).fetchone()[0]
+
+    def histogram(self, cls, attribute: str) -> dict:
+        """ Return the number of objects per day of an attribute, kept up
+        to date by the triggers of the class
+        """
+        prefix = "{}:".format(attribute)
+        rows = self.connection.execute(
+            'SELECT key, count FROM "_counts" WHERE name = ? AND key > ? '
+            'AND key < ? AND count > 0 ORDER BY key',
+            (cls.__name__, prefix, "{};".format(attribute))
+        )
+        return {key[len(prefix):]: count for key, count in rows}
+
+    def page(self, cls, limit: int, after: str = None
+             ) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects ordered by ID, starting after
+        the ID `after`
+        """
+        return self._objects(
+            cls,
+            'SELECT data FROM "{}" WHERE id > ? ORDER BY id LIMIT ?'.format(
+                cls.__name__
+            ),
+            ("" if after is None else after, limit)
+        )
+
+    def _upsert(self, cls) -> str:
+        """ Return the statement inserting or updating an object, with
+        the parameters returned by `_row`
+        """
+        columns = ["id", "data"] + self.columns(cls)
+        return 'INSERT INTO "{}" ({}) VALUES ({}) ON CONFLICT(id) ' \
+            'DO UPDATE SET {}'.format(
+                cls.__name__,
+                ", ".join('"{}"'.format(column) for column in columns),
+                ", ".join("?" for _ in columns),
+                ", ".join(
+                    '"{0}" = excluded."{0}"'.format(column)
+                    for column in columns[1:]
+                ),
+            )
+
+    def _row(self, obj: TypeVar('Base')) -> list:
+        """ Return the parameters of `_upsert` for an object
+        """
+        return [obj.id, json.dumps(obj.to_json(True))] + [
+            self.value(getattr(obj, column, None))
+            for column in self.columns(obj.__class__)
+        ]
+
+    def _write(self, cls, query: str, rows: List[list]):
+        """ Run a statement once per row of parameters and bump the
+        version of the class, in one transaction
+        """
+        connection = self.connection
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(query, rows)
+            connection.execute(
+                'INSERT INTO "_versions" VALUES (?, ?, 1, ?) '
+                'ON CONFLICT(name) DO UPDATE SET version = version + 1, '
+                'modified = excluded.modified',
+                (cls.__name__, uuid.uuid4().hex,
+                 self.value(datetime.utcnow()))
+            )
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        self._write(obj.__class__, self._upsert(obj.__class__),
+                    [self._row(obj)])
+
+    def save_many(self, cls, objs: List[TypeVar('Base')]):
+        """ Insert or update objects of a class in one transaction
+        """
+        self._write(cls, self._upsert(cls), [self._row(obj) for obj in objs])
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        self._write(
+            obj.__class__,
+            'DELETE FROM "{}" WHERE id = ?'.format(obj.__class__.__name__),
+            [(obj.id,)]
+        )
+
+    def _seed_version(self, cls):
+        """ Give a class its row in `_versions` if it has none, so that
+        every process reads the same version before the first write
+        """
+        self.connection.execute(
+            'INSERT OR IGNORE INTO "_versions" VALUES (?, ?, 0, NULL)',
+            (cls.__name__, uuid.uuid4().hex)
+        )
+
+    def version(self, cls) -> Tuple[str, datetime]:
+        """ Return the version of the objects of a class, shared by every
+        process using the database, and the time of the last write
+        """
+        query = 'SELECT token, version, modified FROM "_versions" ' \
+            'WHERE name = ?'
+        row = self.connection.execute(query, (cls.__name__,)).fetchone()
+        if row is None:
+            self._seed_version(cls)
+            row = self.connection.execute(
+                query, (cls.__name__,)
+            ).fetchone()
+        modified = None if row[2] is None else \
+            datetime.strptime(row[2], self.timestamp_format)
+        return "{}-{}".format(row[0], row[1]), modified
+
+    def checkpoint(self, cls):
+        """ Copy the write-ahead log into the database file, which holds
+        every class
+        """
+        self.connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def file_signature(file_path: str) -> tuple:
+    """ Return the (inode, size, modification time) of a file, or None
+    if it does not exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def flush_all():
+    """ Write the pending mutations of every class to disk, then raise
+    the first error if a class failed
+    """
+    with DIRTY_CONDITION:
+        classes = list(DIRTY)
+    error = None
+    for cls in classes:
+        try:
+            cls.storage.flush(cls)
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+
+
+def _flush_forever():
+    """ Body of the background flusher thread: a failed flush is logged
+    and retried after `FLUSH_INTERVAL` seconds
+    """
+    while True:
+        with DIRTY_CONDITION:
+            DIRTY_CONDITION.wait(FLUSH_INTERVAL)
+        try:
+            flush_all()
+        except Exception:
+            logger.exception("write-behind flush failed, will retry")
+            time.sleep(FLUSH_INTERVAL)
+
+
+def start_flusher():
+    """ Start the background flusher thread if it is not running
+    """
+    global _flusher
+    if _flusher is not None:
+        return
+    with FLUSH_LOCK:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, daemon=True)
+            _flusher.start()
+            atexit.register(flush_all)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+""" Store module
+
+Thread-safe in-memory storage of the objects of one class, used for the
+values of `models.storage.DATA`.
+"""
+from contextlib import contextmanager
+from os import getenv
+from typing import Iterator, List, Tuple, TypeVar
+import threading
+
+
+SHARDS = int(getenv("MODELS_SHARDS", "8"))
+
+
+class ReadWriteLock():
+    """ Lock shared by readers and exclusive for a writer; waiting
+    writers go before new readers
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked lock
+        """
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        """ Hold the lock as one of many readers
+        """
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        """ Hold the lock as the only writer
+        """
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class ShardedStore():
+    """ Objects of one class by ID, spread over shards that each have
+    their own read/write lock
+
+    Iteration methods return snapshots, safe to use while other threads
+    write. `index_lock` guards the indexes kept alongside the store.
+    """
+
+    def __init__(self, objs: dict = None, shards: int = SHARDS):
+        """ Initialize a store, optionally filled with `objs`
+        """
+        self.shards = [{} for _ in range(max(shards, 1))]
+        self.locks = [ReadWriteLock() for _ in self.shards]
+        self.index_lock = threading.RLock()
+        for obj_id, obj in (objs or {}).items():
+            self.shards[self._shard(obj_id)][obj_id] = obj
+
+    def _shard(self, obj_id: str) -> int:
+        """ Return the shard number of an ID
+        """
+        return hash(obj_id) % len(self.shards)
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Return the object with an ID, or `default`
+        """
+        shard = self._shard(obj_id)
+        with self.locks[shard].reading():
+            return self.shards[shard].get(obj_id, default)
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Return the object with an ID
+        """
+        shard = self._shard(obj_id)
+        with self.locks[shard].reading():
+            return self.shards[shard][obj_id]
+
+    def __setitem__(self, obj_id: str, obj: TypeVar('Base')):
+        """ Store an object under its ID
+        """
+        shard = self._shard(obj_id)
+        with self.locks[shard].writing():
+            self.shards[shard][obj_id] = obj
+
+    def __delitem__(self, obj_id: str):
+        """ Delete the object with an ID
+        """
+        shard = self._shard(obj_id)
+        with self.locks[shard].writing():
+            del self.shards[shard][obj_id]
+
+    def pop(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Delete and return the object with an ID, or `default`
+        """
+        shard = self._shard(obj_id)
+        with self.locks[shard].writing():
+            return self.shards[shard].pop(obj_id, default)
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Check if an ID is stored
+        """
+        return self.get(obj_id) is not None
+
+    def __len__(self) -> int:
+        """ Return the number of stored objects
+        """
+        return sum(len(shard) for shard in self.shards)
+
+    def items(self) -> List[Tuple[str, TypeVar('Base')]]:
+        """ Return a snapshot of the (ID, object) pairs, shard by shard
+        """
+        result = []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock.reading():
+                result.extend(shard.items())
+        return result
+
+    def keys(self) -> List[str]:
+        """ Return a snapshot of the IDs
+        """
+        return [obj_id for obj_id, _ in self.items()]
+
+    def values(self) -> List[TypeVar('Base')]:
+        """ Return a snapshot of the objects
+        """
+        return [obj for _, obj in self.items()]
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over a snapshot of the IDs
+        """
+        return iter(self.keys())
+
+    def snapshot(self) -> dict:
+        """ Return a consistent-per-shard copy of the store as a dict
+        """
+        return dict(self.items())
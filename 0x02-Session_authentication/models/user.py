@@ -9,14 +9,19 @@ class User(Base):
     """ User class
     """
 
+    __slots__ = ("email", "_password", "first_name", "last_name")
+    indexed_attributes = ("email",)
+    sorted_attributes = Base.sorted_attributes + ("email",)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
         super().__init__(*args, **kwargs)
-        self.email = kwargs.get('email')
-        self._password = kwargs.get('_password')
-        self.first_name = kwargs.get('first_name')
-        self.last_name = kwargs.get('last_name')
+        set_attribute = object.__setattr__
+        set_attribute(self, "email", kwargs.get('email'))
+        set_attribute(self, "_password", kwargs.get('_password'))
+        set_attribute(self, "first_name", kwargs.get('first_name'))
+        set_attribute(self, "last_name", kwargs.get('last_name'))
 
     @property
     def password(self) -> str:
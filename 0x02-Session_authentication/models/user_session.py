@@ -6,8 +6,12 @@ from models.base import Base
 class UserSession(Base):
     """UserSession class"""
 
+    __slots__ = ("user_id", "session_id")
+    indexed_attributes = ("session_id",)
+
     def __init__(self, *args: list, **kwargs: dict) -> None:
         """Initialize a UserSession instance"""
         super().__init__(*args, **kwargs)
-        self.user_id = kwargs.get('user_id')
-        self.session_id = kwargs.get('session_id')
+        set_attribute = object.__setattr__
+        set_attribute(self, "user_id", kwargs.get('user_id'))
+        set_attribute(self, "session_id", kwargs.get('session_id'))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+""" Stress the cross-process reload: worker processes share the journal
+files, each creates and removes users, then waits until it sees the
+users of all the others
+
+    ./stress_reload.py 4 500
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import models.storage
+from models.user import User
+
+
+def worker(number: int, iterations: int, barrier, results):
+    """ Create users, remove every other one, then time how long until
+    the users of every worker are visible
+    """
+    User.load_from_file()
+    for i in range(iterations):
+        user = User()
+        user.email = "p{}-{}@hbtn.io".format(number, i)
+        user.save()
+        if i % 2 == 0:
+            user.remove()
+    barrier.wait()
+    start = time.perf_counter()
+    expected = results["expected"]
+    while User.count() != expected:
+        if time.perf_counter() - start > 30:
+            results[number] = None
+            return
+        time.sleep(0.01)
+    for n in range(results["workers"]):
+        email = "p{}-{}@hbtn.io".format(n, iterations - 1)
+        assert User.search({"email": email})[0].email == email
+    results[number] = time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    models.storage.RELOAD_INTERVAL = 0.1
+    User.persistence = "journal"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        manager = multiprocessing.Manager()
+        results = manager.dict(
+            expected=workers * (iterations // 2), workers=workers
+        )
+        barrier = manager.Barrier(workers)
+        pool = [
+            multiprocessing.Process(
+                target=worker, args=(n, iterations, barrier, results)
+            )
+            for n in range(workers)
+        ]
+        for process in pool:
+            process.start()
+        for process in pool:
+            process.join()
+        delays = [results.get(n) for n in range(workers)]
+        if None in delays or any(process.exitcode for process in pool):
+            sys.exit("workers did not converge: {}".format(delays))
+        User.load_from_file()
+        assert User.count() == results["expected"]
+        print("{} workers x {} iterations converged in {:.2f}s".format(
+            workers, iterations, max(delays)
+        ))
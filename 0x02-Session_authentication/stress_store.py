@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Stress the model store: threads create, search and remove users
+concurrently, then the store, its indexes and the file are checked
+
+    ./stress_store.py 16 500
+"""
+import os
+import sys
+import tempfile
+import threading
+from models.storage import INDEXES, SORTED_INDEXES
+from models.user import User
+
+
+def worker(number: int, iterations: int, errors: list):
+    """ Create users, look them up, remove every other one
+    """
+    try:
+        for i in range(iterations):
+            user = User()
+            user.email = "t{}-{}@hbtn.io".format(number, i)
+            user.save()
+            assert User.get(user.id) is user
+            assert User.search({"email": user.email}) == [user]
+            assert len(User.all()) >= 1
+            User.page(10, user.id)
+            if i % 2 == 0:
+                user.remove()
+                assert User.get(user.id) is None
+    except Exception as e:
+        errors.append(e)
+
+
+def check(expected: int):
+    """ Check the store and its indexes hold `expected` users
+    """
+    users = User.all()
+    assert User.count() == expected == len(users), (User.count(), expected)
+    assert len(INDEXES["User"]["email"].values) == expected
+    assert len(SORTED_INDEXES["User"]["id"].keys) == expected
+    for user in users:
+        assert User.search({"email": user.email}) == [user]
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        for persistence in ("journal", "snapshot"):
+            User.persistence = persistence
+            User.load_from_file()
+            errors = []
+            pool = [
+                threading.Thread(target=worker, args=(n, iterations, errors))
+                for n in range(threads)
+            ]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            if errors:
+                raise errors[0]
+
+            expected = threads * (iterations // 2)
+            check(expected)
+            User.load_from_file()
+            check(expected)
+            print("{}: {} threads x {} iterations OK".format(
+                persistence, threads, iterations
+            ))
+            User.save_to_file()
+            os.remove(User.storage.file_path(User))
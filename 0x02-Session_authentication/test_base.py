@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+""" Tests of models.base
+
+    python3 -m unittest test_base
+"""
+import json
+import unittest
+from models.user import User
+
+
+class TestSerialization(unittest.TestCase):
+    """ Cached serializations
+    """
+
+    def test_cache_dropped_on_write(self):
+        """ Setting an attribute after construction drops the cached
+        serializations
+        """
+        user = User(email="before@x")
+        self.assertEqual(user.to_json()["email"], "before@x")
+        etag = user.etag()
+        user.email = "after@x"
+        self.assertEqual(user.to_json()["email"], "after@x")
+        self.assertEqual(json.loads(user.to_json_bytes())["email"], "after@x")
+        self.assertNotEqual(user.etag(), etag)
+        user.password = "pwd"
+        self.assertIn("_password", user.to_json(True))
+        self.assertNotIn("_password", user.to_json())
+
+    def test_to_dict(self):
+        """ Private attributes are only serialized for storage
+        """
+        user = User(id="1", email="a@x", _password="p")
+        self.assertEqual(
+            set(user.to_dict(True)),
+            {"id", "created_at", "updated_at", "email", "_password",
+             "first_name", "last_name"}
+        )
+        self.assertNotIn("_password", user.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+""" Tests of models.index
+
+    python3 -m unittest test_index
+"""
+import unittest
+from models.index import SortedIndex
+
+
+class Obj():
+    """ Object with an ID and a value
+    """
+
+    def __init__(self, id: str, value):
+        """ Initialize an object
+        """
+        self.id = id
+        self.value = value
+
+
+class TestSortedIndex(unittest.TestCase):
+    """ Index ordered on one attribute
+    """
+
+    def test_lazy_sort(self):
+        """ The keys are sorted on first use, including the changes made
+        since the index was built
+        """
+        index = SortedIndex("value")
+        index.build([Obj("a", 3), Obj("b", 1), Obj("c", None)])
+        self.assertIsNone(index._keys)
+        index.add(Obj("d", 2))
+        index.add(Obj("a", 0))
+        index.discard("b")
+        self.assertIsNone(index._keys)
+        self.assertEqual(list(index.ids()), ["a", "d"])
+        self.assertEqual(index.count(1, 3), 1)
+        index.add(Obj("e", 1))
+        self.assertEqual(list(index.ids()), ["a", "e", "d"])
+
+    def test_mixed_types(self):
+        """ Values of different types are grouped by type, numbers
+        first, and a value that can't be compared with the others of
+        its type is left out
+        """
+        index = SortedIndex("value")
+        index.build([Obj("a", "x"), Obj("b", 2), Obj("c", 1.5),
+                     Obj("d", {}), Obj("e", {"k": 1})])
+        self.assertEqual(list(index.ids()), ["c", "b", "d", "a"])
+        self.assertEqual(sorted(index.values), ["a", "b", "c", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+""" Tests of models.snapshot
+
+    python3 -m unittest test_snapshot
+"""
+import io
+import unittest
+from datetime import datetime
+from models import snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    """ Round trips through the binary format
+    """
+
+    def round_trip(self, records: list) -> list:
+        """ Dump records and load them back
+        """
+        f = io.BytesIO()
+        snapshot.dump(records, f)
+        f.seek(0)
+        return list(snapshot.load(f))
+
+    def test_round_trip(self):
+        """ Datetimes, None, unicode and missing keys come back as
+        written, a missing key as None
+        """
+        records = [
+            {"id": "1", "created_at": datetime(2024, 2, 29, 23, 59, 59),
+             "email": "zoë@example.com", "first_name": "名前",
+             "last_name": None},
+            {"id": "2", "created_at": None, "email": None,
+             "first_name": "\u0000\U0001F600", "last_name": "O'Brien"},
+            {"id": "3", "created_at": datetime(1969, 7, 20, 20, 17, 40)},
+        ]
+        loaded = self.round_trip(records)
+        self.assertEqual(loaded[:2], records[:2])
+        self.assertEqual(loaded[2], dict(
+            records[2], email=None, first_name=None, last_name=None
+        ))
+
+    def test_timestamps_to_the_second(self):
+        """ Datetimes keep the resolution of the JSON snapshots
+        """
+        loaded = self.round_trip([
+            {"id": "1", "created_at": datetime(2024, 1, 1, 0, 0, 1, 999999)}
+        ])
+        self.assertEqual(
+            loaded[0]["created_at"], datetime(2024, 1, 1, 0, 0, 1)
+        )
+
+    def test_empty(self):
+        """ A snapshot without records loads as none
+        """
+        self.assertEqual(self.round_trip([]), [])
+
+    def test_bad_magic(self):
+        """ A file that isn't a binary snapshot is refused
+        """
+        with self.assertRaises(ValueError):
+            list(snapshot.load(io.BytesIO(b"{}" + b"\x00" * 20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
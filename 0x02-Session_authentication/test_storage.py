@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+""" Tests of models.storage
+
+    python3 -m unittest test_storage
+"""
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+from models import storage
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+
+class StorageTestCase(unittest.TestCase):
+    """ Run every test in an empty directory, with no class loaded, on
+    the backend returned by `backend`
+    """
+
+    def backend(self) -> storage.Storage:
+        """ Return a new backend for User
+        """
+        return storage.FileStorage()
+
+    def setUp(self):
+        """ Move to a temporary directory, forget the loaded classes and
+        load User from a new backend
+        """
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp_dir.name)
+        for state in (storage.DATA, storage.INDEXES, storage.SORTED_INDEXES,
+                      storage.HISTOGRAMS, storage.FILE_STATES,
+                      storage.FILE_SIZES, storage.VERSIONS):
+            patch = mock.patch.dict(state, clear=True)
+            patch.start()
+            self.addCleanup(patch.stop)
+        patch = mock.patch.object(User, "storage", self.backend())
+        patch.start()
+        self.addCleanup(patch.stop)
+        User.load_from_file()
+
+    def reload(self):
+        """ Forget the objects of User, then load them from a new backend
+        """
+        storage.DATA.pop("User", None)
+        User.storage = self.backend()
+        User.load_from_file()
+
+    def create(self, email: str, day: int = 1) -> User:
+        """ Save and return a new user created on a day of January 2024
+        """
+        user = User(email=email, created_at=datetime(2024, 1, day))
+        user.save()
+        return user
+
+    def emails(self, users) -> list:
+        """ Return the sorted emails of users
+        """
+        return sorted(user.email for user in users)
+
+
+class BackendTests():
+    """ Cases run against every backend
+    """
+
+    def test_save_and_get(self):
+        """ A saved object is found by ID, with its attributes
+        """
+        user = self.create("a@x")
+        self.assertEqual(User.get(user.id).to_json(), user.to_json())
+        self.assertIsNone(User.get("missing"))
+
+    def test_update(self):
+        """ Saving an object again updates it and its indexes
+        """
+        user = self.create("a@x")
+        user.email = "b@x"
+        user.save()
+        self.assertEqual(User.search({"email": "a@x"}), [])
+        self.assertEqual(User.search({"email": "b@x"}), [user])
+        self.assertEqual(User.count(), 1)
+
+    def test_remove(self):
+        """ A removed object is gone, removing it again does nothing
+        """
+        user = self.create("a@x")
+        self.create("b@x")
+        user.remove()
+        user.remove()
+        self.assertIsNone(User.get(user.id))
+        self.assertEqual(self.emails(User.all()), ["b@x"])
+        self.assertEqual(User.count(), 1)
+
+    def test_search(self):
+        """ Equality, prefix and range conditions, order and limit
+        """
+        for i, email in enumerate(("bob@x", "alice@x", "bea@y", "carl@x")):
+            self.create(email, i + 1)
+        self.assertEqual(
+            self.emails(User.search({"email": "bea@y"})), ["bea@y"]
+        )
+        self.assertEqual(
+            [u.email for u in User.search(prefix={"email": "b"},
+                                          order_by="email")],
+            ["bea@y", "bob@x"]
+        )
+        self.assertEqual(
+            [u.email for u in User.search(order_by="-created_at", limit=2)],
+            ["carl@x", "bea@y"]
+        )
+        self.assertEqual(
+            self.emails(User.search(range={"created_at": (
+                datetime(2024, 1, 2), datetime(2024, 1, 4)
+            )})),
+            ["alice@x", "bea@y"]
+        )
+
+    def test_counts(self):
+        """ Totals, ranges and histograms follow saves and removals
+        """
+        self.create("a@x", 1)
+        self.create("b@x", 1)
+        removed = self.create("c@x", 2)
+        self.create("d@x", 3)
+        removed.remove()
+        self.assertEqual(User.count(), 3)
+        self.assertEqual(
+            User.count_range("created_at", datetime(2024, 1, 1),
+                             datetime(2024, 1, 3)), 2
+        )
+        self.assertEqual(User.count_range("email", "b"), 2)
+        self.assertEqual(
+            User.histogram(), {"2024-01-01": 2, "2024-01-03": 1}
+        )
+
+    def test_page(self):
+        """ Pages follow the order of the IDs
+        """
+        ids = sorted(self.create("{}@x".format(i)).id for i in range(5))
+        first = User.page(2)
+        self.assertEqual([u.id for u in first], ids[:2])
+        self.assertEqual([u.id for u in User.page(10, first[-1].id)],
+                         ids[2:])
+
+    def test_bulk_save(self):
+        """ Objects saved at once are all stored
+        """
+        users = [User(email="{}@x".format(i)) for i in range(3)]
+        User.bulk_save(users)
+        self.assertEqual(User.count(), 3)
+        self.assertEqual(User.search({"email": "1@x"}), [users[1]])
+
+    def test_version(self):
+        """ The version changes on every write
+        """
+        before = User.version()[0]
+        user = self.create("a@x")
+        after_save = User.version()[0]
+        user.remove()
+        self.assertNotEqual(before, after_save)
+        self.assertNotEqual(User.version()[0], after_save)
+
+    def test_version_shared(self):
+        """ Loading the same data again gives the same version, as
+        another process would
+        """
+        empty = User.version()[0]
+        self.reload()
+        self.assertEqual(User.version()[0], empty)
+        self.create("a@x")
+        version = User.version()[0]
+        self.reload()
+        self.assertEqual(User.version()[0], version)
+        self.assertNotEqual(version, empty)
+
+    def test_reload(self):
+        """ Saves and removals survive a reload, and so do timestamps
+        and unset attributes
+        """
+        kept = self.create("a@x")
+        kept.first_name = "Zoë"
+        kept.save()
+        self.create("b@x").remove()
+        self.reload()
+        self.assertEqual([u.to_json(True) for u in User.all()],
+                         [kept.to_json(True)])
+
+    def test_save_to_file(self):
+        """ Writing every object at once keeps them all
+        """
+        self.create("a@x")
+        self.create("b@x")
+        User.save_to_file()
+        self.reload()
+        self.assertEqual(self.emails(User.all()), ["a@x", "b@x"])
+
+
+class TestFileStorage(BackendTests, StorageTestCase):
+    """ File backend, snapshot persistence
+    """
+
+
+class TestFileStorageJournal(BackendTests, StorageTestCase):
+    """ File backend, journal persistence
+    """
+
+    def setUp(self):
+        """ Use the journal mode
+        """
+        patch = mock.patch.object(User, "persistence", "journal")
+        patch.start()
+        self.addCleanup(patch.stop)
+        super().setUp()
+
+
+class TestSQLiteStorage(BackendTests, StorageTestCase):
+    """ SQLite backend
+    """
+
+    def backend(self) -> storage.Storage:
+        """ Return a new SQLite backend on the database of the test
+        """
+        return storage.SQLiteStorage(".db.sqlite3", TIMESTAMP_FORMAT)
+
+    def test_no_files(self):
+        """ Neither the objects nor their indexes are held in memory,
+        and no snapshot is written
+        """
+        self.create("a@x")
+        User.save_to_file()
+        self.assertEqual(User.count(), 1)
+        self.assertNotIn("User", storage.DATA)
+        self.assertNotIn("User", storage.SORTED_INDEXES)
+        self.assertEqual(
+            [name for name in os.listdir() if name.startswith(".db_User")],
+            []
+        )
+
+
+class TestJournal(StorageTestCase):
+    """ Journal persistence
+    """
+
+    def setUp(self):
+        """ Use the journal mode
+        """
+        patch = mock.patch.object(User, "persistence", "journal")
+        patch.start()
+        self.addCleanup(patch.stop)
+        super().setUp()
+
+    def test_version_after_foreign_records(self):
+        """ Appending after records of another process reads them, so
+        that the version is the one of a process loading the journal
+        """
+        self.create("a@x")
+        other = User(email="other@x")
+        with open(User.storage.file_path(User, "journal"), "a") as f:
+            f.write(json.dumps({"op": "save", "obj": other.to_json(True)}))
+            f.write("\n")
+        self.create("b@x")
+        self.assertEqual(
+            self.emails(User.all()), ["a@x", "b@x", "other@x"]
+        )
+        version = User.version()[0]
+        self.reload()
+        self.assertEqual(User.version()[0], version)
+
+    def test_version_write_behind(self):
+        """ Mutations waiting for the flusher give a version local to
+        the process, the shared one once they are written
+        """
+        self.create("a@x")
+        shared = User.version()[0]
+        with mock.patch.object(User, "write_behind", True), \
+                mock.patch.object(storage, "start_flusher"):
+            self.create("b@x")
+            pending = User.version()[0]
+            storage.flush_all()
+        self.assertNotIn(pending, (shared, User.version()[0]))
+        version = User.version()[0]
+        self.reload()
+        self.assertEqual(User.version()[0], version)
+
+    def test_torn_tail(self):
+        """ Records appended after a partial one, left by a crash, are
+        kept, whether they are appended before or after a reload
+        """
+        self.create("before@x")
+        with open(User.storage.file_path(User, "journal"), "ab") as f:
+            f.write(b'{"op": "save", "obj": {"id": "torn", "ema')
+        self.create("same-process@x")
+        with self.assertLogs(storage.logger, "WARNING"):
+            self.reload()
+        self.create("after-reload@x")
+        self.reload()
+        self.assertEqual(
+            self.emails(User.all()),
+            ["after-reload@x", "before@x", "same-process@x"]
+        )
+
+    def test_torn_tail_cut_on_load(self):
+        """ Loading cuts a partial record off the end of the journal
+        """
+        self.create("before@x")
+        journal = User.storage.file_path(User, "journal")
+        size = os.path.getsize(journal)
+        with open(journal, "ab") as f:
+            f.write(b'{"op": "sa')
+        with self.assertLogs(storage.logger, "WARNING"):
+            self.reload()
+        self.assertEqual(os.path.getsize(journal), size)
+        self.create("after@x")
+        self.reload()
+        self.assertEqual(User.count(), 2)
+
+
+class TestFileFormat(StorageTestCase):
+    """ Snapshot file formats
+    """
+
+    def test_switch_to_binary(self):
+        """ Switching to the binary format keeps the objects of the JSON
+        snapshot, written in binary by the next save
+        """
+        user = self.create("json@x")
+        with mock.patch.object(User, "file_format", "binary"):
+            self.reload()
+            self.assertEqual(User.get(user.id).email, "json@x")
+            self.create("binary@x")
+            self.assertTrue(
+                os.path.exists(User.storage.file_path(User, "bin"))
+            )
+            os.remove(User.storage.file_path(User, "json"))
+            self.reload()
+            self.assertEqual(
+                self.emails(User.all()), ["binary@x", "json@x"]
+            )
+
+    def test_convert_file(self):
+        """ Converting a snapshot keeps every attribute
+        """
+        user = self.create("zoë@x")
+        User.storage.convert_file(User, "json", "binary")
+        with mock.patch.object(User, "file_format", "binary"):
+            os.remove(User.storage.file_path(User, "json"))
+            self.reload()
+        self.assertEqual(
+            User.get(user.id).to_json(True), user.to_json(True)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
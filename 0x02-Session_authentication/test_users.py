@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+""" Tests of the users views
+
+    python3 -m unittest test_users
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from models import storage
+from models.user import User
+
+
+class TestConditionalGet(unittest.TestCase):
+    """ Entity tags of the users views, through the test client
+    """
+
+    def setUp(self):
+        """ Move to a temporary directory, with no user, and disable the
+        authentication
+        """
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp_dir.name)
+        for state in (storage.DATA, storage.INDEXES, storage.SORTED_INDEXES,
+                      storage.HISTOGRAMS, storage.FILE_STATES,
+                      storage.FILE_SIZES, storage.VERSIONS):
+            patch = mock.patch.dict(state, clear=True)
+            patch.start()
+            self.addCleanup(patch.stop)
+        # imported here, as the views load the models from the current
+        # directory when first imported
+        from api.v1 import app
+        patch = mock.patch.object(app, "auth", None)
+        patch.start()
+        self.addCleanup(patch.stop)
+        User.load_from_file()
+        self.client = app.app.test_client()
+        self.user = User(email="a@x", first_name="Ann")
+        self.user.save()
+
+    def check_conditional(self, url: str):
+        """ A GET is answered 200, then 304 with the ETag it returned,
+        then 200 with another ETag once the user is updated
+        """
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+
+        cached = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b"")
+        self.assertEqual(cached.headers["ETag"], etag)
+
+        updated = self.client.put(
+            "/api/v1/users/{}".format(self.user.id),
+            json={"first_name": "Zoë"}
+        )
+        self.assertEqual(updated.status_code, 200)
+        changed = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+        self.assertIn("Zoë", str(changed.get_json()))
+
+    def test_one_user(self):
+        """ GET /api/v1/users/:id
+        """
+        self.check_conditional("/api/v1/users/{}".format(self.user.id))
+
+    def test_all_users(self):
+        """ GET /api/v1/users
+        """
+        self.check_conditional("/api/v1/users")
+
+    def test_all_users_other_process(self):
+        """ A process that loaded the same files answers 304 to the ETag
+        of the list sent by another
+        """
+        etag = self.client.get("/api/v1/users").headers["ETag"]
+        storage.DATA.pop("User")
+        with mock.patch.object(User, "storage", storage.FileStorage()):
+            User.load_from_file()
+            cached = self.client.get(
+                "/api/v1/users", headers={"If-None-Match": etag}
+            )
+        self.assertEqual(cached.status_code, 304)
+
+    def test_one_user_representation(self):
+        """ A user is represented like the responses of the other views
+        """
+        response = self.client.get("/api/v1/users/{}".format(self.user.id))
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.get_json(), self.user.to_json())
+        listed = self.client.get("/api/v1/users")
+        self.assertEqual(listed.get_json(), [response.get_json()])
+
+
+if __name__ == "__main__":
+    unittest.main()
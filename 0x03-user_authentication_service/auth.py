@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 """Auth module"""
+import logging
+import os
 import uuid
 from sqlalchemy.orm.exc import NoResultFound
 from user import User
@@ -7,14 +9,27 @@ import bcrypt
 from db import DB
 
 
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+logger = logging.getLogger(__name__)
+
+
 def _hash_password(password: str) -> bytes:
     """Return a salted hash of the input password"""
     bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
     hash = bcrypt.hashpw(bytes, salt)
     return hash
 
 
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """Check if a hash was made with another scheme or work factor"""
+    try:
+        _, prefix, rounds, _ = hashed_password.split(b"$", 3)
+        return prefix != b"2b" or int(rounds) != BCRYPT_ROUNDS
+    except ValueError:
+        return True
+
+
 def _generate_uuid() -> str:
     """Return a new unique identifier"""
     return str(uuid.uuid4())
@@ -48,10 +63,21 @@ class Auth:
         try:
             user = self._db.find_user_by(email=email)
             pass_bytes = password.encode("utf-8")
-            return bcrypt.checkpw(pass_bytes, user.hashed_password)
+            if not bcrypt.checkpw(pass_bytes, user.hashed_password):
+                return False
         except Exception:
             return False
 
+        if _needs_rehash(user.hashed_password):
+            try:
+                self._db.update_user(
+                    user.id, hashed_password=_hash_password(password)
+                )
+            except Exception:
+                logger.exception("could not rehash the password of %s",
+                                 user.id)
+        return True
+
     def create_session(self, email: str) -> str:
         """Return session ID"""
         try: